@@ -0,0 +1,7 @@
+"""
+Riyadh KSU spatial analysis (installed as the `riyadh_ksu_geo` package).
+
+The modules in scripts/ import each other through this package, so install
+the project first (`uv sync` or `pip install -e ".[app]"`); after that both
+`python scripts/etl.py` and the console commands in cli.py work.
+"""
@@ -1,25 +1,41 @@
 # adding needed imports
 
-from create_tables import get_connection
+from riyadh_ksu_geo.create_tables import get_connection
+import numpy as np
 import pandas as pd
 import geopandas as gpd
+from pandas.api.extensions import take
 import psycopg2
-from sql_analysis_queries import (district_stats_query, 
-                                  gates_with_district_query, 
-                                  gate_restaurant_distances_query, 
-                                  gate_restaurants_1km_query)
-
-
+import shapely
+from riyadh_ksu_geo.sql_analysis_queries import (district_stats_query, 
+                                                 gates_with_district_query, 
+                                                 gate_restaurant_distances_query, 
+                                                 gate_restaurants_1km_query,
+                                                 campus_options_query,
+                                                 restaurant_points_query,
+                                                 district_polygons_query,
+                                                 restaurants_in_tiles_query,
+                                                 restaurant_snapshots_query,
+                                                 gate_snapshot_diff_query,
+                                                 district_snapshot_diff_query)
+from riyadh_ksu_geo.query_builder import (ALL_OPTION,
+                                          build_gate_name_options_query,
+                                          build_filtered_gate_summary_query)
+from riyadh_ksu_geo.query_stream import read_prepared, stream_query, DEFAULT_FETCH_SIZE
+from riyadh_ksu_geo.telemetry import setup_from_env, timed_query
+
+
+@timed_query("district_stats")
 def load_district_stats(conn):
     """
 
     helper function the excute a predefined query (district_stats_query)
-    and loaded it to GeoDataFrame.
+    as a prepared statement and loaded it to GeoDataFrame.
     """
     try:
-        gdf = gpd.read_postgis(
-        sql = district_stats_query,
-        con= conn,
+        gdf = read_prepared(
+        conn,
+        district_stats_query,
         geom_col= "district_geom"
         )
     except Exception as e:
@@ -29,16 +45,17 @@ def load_district_stats(conn):
         return gdf
     
 
+@timed_query("gates_with_district")
 def load_gates_with_district(conn):
     """
 
     helper function the excute a predefined query (gates_with_district_query)
-    and loaded it to GeoDataFrame.
+    as a prepared statement and loaded it to GeoDataFrame.
     """
     try:
-        gdf = gpd.read_postgis(
-        sql = gates_with_district_query,
-        con= conn,
+        gdf = read_prepared(
+        conn,
+        gates_with_district_query,
         geom_col= "gate_geom"
         )
     except Exception as e:
@@ -47,13 +64,15 @@ def load_gates_with_district(conn):
     else:
         return gdf
     
+@timed_query("gate_restaurant_distances")
 def load_gate_restaurant_distances(conn):
     """
     helper function the excute a predefined query (gate_restaurant_distances_query)
-    and loaded it to Pandas DataFrame.
+    as a prepared statement and loaded it to Pandas DataFrame.
+    For large data use the streamed reductions below instead.
     """
     try:
-        df = pd.read_sql(gate_restaurant_distances_query, conn)
+        df = read_prepared(conn, gate_restaurant_distances_query)
     
     except Exception as e:
         print("Error while excuting gate_restaurant_distances_query:" , e)
@@ -77,20 +96,169 @@ def get_nearest_restaurant_per_gate(gate_restaurant_distances_df:pd.DataFrame):
 
 
 
+def stream_gate_restaurant_distances(conn, fetch_size=DEFAULT_FETCH_SIZE):
+    """
+
+    Generator over gate_restaurant_distances_query in DataFrame chunks of
+    `fetch_size` rows (server-side cursor), for reductions with bounded
+    client memory.
+    """
+    return stream_query(conn, gate_restaurant_distances_query, fetch_size=fetch_size)
+
+
+def get_nearest_restaurant_per_gate_streamed(conn, fetch_size=DEFAULT_FETCH_SIZE):
+    """
+
+    Same result as get_nearest_restaurant_per_gate(load_gate_restaurant_distances(conn)),
+    but only one chunk plus the current best row per gate is held in memory.
+    """
+    nearest_df = None
+    for chunk in stream_gate_restaurant_distances(conn, fetch_size):
+        if nearest_df is not None:
+            chunk = pd.concat([nearest_df, chunk], ignore_index=True)
+        nearest_df = get_nearest_restaurant_per_gate(chunk)
+
+    if nearest_df is None:
+        return pd.DataFrame()
+    return nearest_df.sort_values("gate_id").reset_index(drop=True)
+
+
+def get_distance_histogram_per_gate_streamed(
+    conn,
+    bins_km=(0, 0.25, 0.5, 1, 2, 5, float("inf")),
+    fetch_size=DEFAULT_FETCH_SIZE
+):
+    """
+
+    Count restaurants per gate per distance band (bins_km edges, right-closed;
+    the first band includes its lower edge, so dist_km == 0 is counted)
+    while streaming gate_restaurant_distances_query.
+    Returns a DataFrame indexed by gate_id with one column per band.
+    """
+    histogram = None
+    for chunk in stream_gate_restaurant_distances(conn, fetch_size):
+        bands = pd.cut(
+            chunk["dist_km"].astype(float), bins=list(bins_km), include_lowest=True
+        )
+        counts = pd.crosstab(chunk["gate_id"], bands, dropna=False)
+        histogram = counts if histogram is None else histogram.add(counts, fill_value=0)
+
+    if histogram is None:
+        return pd.DataFrame()
+    return histogram.fillna(0).astype(int)
+
+
+@timed_query("gate_restaurants_1km")
 def load_gate_restaurants_1km(conn):
     """
 
     Helper function that executes the predefined query (gate_restaurants_1km_query)
-    and loads the result into a Pandas DataFrame.
+    as a prepared statement and loads the result into a Pandas DataFrame.
     """
     try:
-        df = pd.read_sql(gate_restaurants_1km_query, conn)
+        df = read_prepared(conn, gate_restaurants_1km_query)
     except Exception as e:
         print("Error while executing gate_restaurants_1km_query:", e)
     else:
         return df
 
 
+NEAREST_COLS = [
+    "gate_id",
+    "restaurant_id",
+    "restaurant_name",
+    "rating",
+    "categories",
+    "dist_km",
+]
+
+
+def _first_row_positions(gate_index: pd.Index, gate_ids) -> np.ndarray:
+    """
+
+    For every gate in `gate_index`, the position of its first row in
+    `gate_ids`, or -1 when the gate has no row (one hash lookup per provider).
+    """
+    positions = gate_index.get_indexer(gate_ids)
+    rows = np.flatnonzero(positions >= 0)
+    first = np.full(len(gate_index), -1, dtype=np.intp)
+    # scatter in reverse so the first row of a duplicated gate wins
+    first[positions[rows[::-1]]] = rows[::-1]
+    return first
+
+
+def _take_column(values, positions):
+    """Rows `positions` of a Series as a new array (-1 -> missing value)."""
+    if isinstance(values.dtype, np.dtype):
+        # plain NumPy column; take() promotes e.g. int -> float for NaN
+        return take(values.to_numpy(), positions, allow_fill=True)
+    return values.array.take(positions, allow_fill=True)
+
+
+def build_gate_summary_frame(
+    gates_with_district_gdf: gpd.GeoDataFrame,
+    metric_providers,
+    include_geometry: bool = False
+) -> pd.DataFrame:
+    """
+
+    Collect per-gate metric sets into one gate_id-indexed frame.
+
+    `metric_providers` is an iterable of DataFrames keyed by gate_id (column
+    or index), or of callables returning one, so a provider is only computed
+    when the summary is built. Each provider is aligned to the gates with one
+    positional take per column (missing gates -> NaN, duplicated gates -> first
+    row) and the frame is constructed once, instead of one merge (and one copy
+    of the growing summary) per metric set.
+    Columns already provided by the gates (or an earlier provider) are skipped.
+
+    The gate geometry is left out unless `include_geometry` is True; use
+    gate_geometry() to attach it later, only where a view needs it.
+    """
+    gates_df = gates_with_district_gdf
+    geometry_name = (
+        gates_df.geometry.name if isinstance(gates_df, gpd.GeoDataFrame) else None
+    )
+    # first row per gate, taken straight from the gates (no drop / copy of the frame)
+    keep = np.flatnonzero(~gates_df["gate_id"].duplicated().to_numpy())
+    gate_index = pd.Index(gates_df["gate_id"].to_numpy()[keep], name="gate_id")
+
+    columns = {
+        column: _take_column(gates_df[column], keep)
+        for column in gates_df.columns if column not in ("gate_id", geometry_name)
+    }
+    for provider in metric_providers:
+        metrics = provider() if callable(provider) else provider
+        gate_ids = metrics["gate_id"] if "gate_id" in metrics.columns else metrics.index
+        positions = _first_row_positions(gate_index, gate_ids)
+        for column in metrics.columns:
+            if column == "gate_id" or column in columns:
+                continue
+            columns[column] = _take_column(metrics[column], positions)
+
+    # every column is a fresh array from _take_column, nothing to copy
+    summary = pd.DataFrame(columns, index=gate_index, copy=False)
+
+    if include_geometry:
+        geometry = gate_geometry(gates_with_district_gdf)
+        return gpd.GeoDataFrame(
+            summary,
+            geometry=geometry.reindex(summary.index),
+            crs=geometry.crs
+        )
+    return summary
+
+
+def gate_geometry(gates_with_district_gdf: gpd.GeoDataFrame) -> gpd.GeoSeries:
+    """
+
+    Gate geometry as a GeoSeries indexed by gate_id, ready to align with a
+    summary built by build_gate_summary_frame.
+    """
+    gates = gates_with_district_gdf.drop_duplicates(subset=["gate_id"])
+    return gates.set_index("gate_id").geometry
+
+
 def build_gate_summary(
     gates_with_district_gdf: gpd.GeoDataFrame,
     nearest_df: pd.DataFrame,
@@ -100,35 +268,346 @@ def build_gate_summary(
     Combine gate + district info, nearest restaurant info, and 1 km statistics
     into a single summary DataFrame with one row per gate.
     """
-    #
-    gates_df = gates_with_district_gdf.drop(columns=["gate_geom"])
-    gates_df = gates_df.drop_duplicates(subset=["gate_id"])
-
-    
-    nearest_cols = [
-        "gate_id",
-        "restaurant_id",
-        "restaurant_name",
-        "rating",
-        "categories",
-        "dist_km",
-    ]
-    nearest_df_clean = nearest_df[nearest_cols]
-    summary = gates_df.merge(nearest_df_clean, on="gate_id", how="left")
-
-   
-    gate_restaurants_1km_clean = gate_restaurants_1km_df.drop(
-        columns=["campus", "gate_name_en"],  
-        errors="ignore"
+    summary = build_gate_summary_frame(
+        gates_with_district_gdf,
+        [
+            nearest_df[NEAREST_COLS],
+            gate_restaurants_1km_df.drop(
+                columns=["campus", "gate_name_en"],
+                errors="ignore"
+            ),
+        ]
     )
+    return summary.reset_index()
+
+
+# -------------------------------------------------------------------
+# Accessibility score
+# -------------------------------------------------------------------
+# attractiveness = base + sum(weight * normalised attribute), see
+# restaurant_attractiveness. A negative weight turns an attribute into a penalty.
+DEFAULT_ATTRACTIVENESS_WEIGHTS = {
+    "base": 0.2,
+    "rating": 0.4,
+    "likes": 0.15,
+    "rating_signals": 0.15,
+    "price_code": 0.1,
+}
+
+DECAY_FUNCTIONS = {
+    "gaussian": lambda dist, bandwidth: np.exp(-0.5 * (dist / bandwidth) ** 2),
+    "exponential": lambda dist, bandwidth: np.exp(-dist / bandwidth),
+}
+
+# default cutoff (in bandwidths) beyond which a restaurant is ignored,
+# the decay weight there is ~1% (gaussian) / ~0.7% (exponential)
+DECAY_CUTOFF_BANDWIDTHS = {"gaussian": 3.0, "exponential": 5.0}
+
+SCORE_BATCH_SIZE = 20_000
+
+
+@timed_query("restaurant_points")
+def load_restaurant_points(conn):
+    """
+
+    Helper function that executes restaurant_points_query and returns one row
+    per restaurant with its attractiveness attributes and x / y in EPSG:32638.
+    """
+    try:
+        df = read_prepared(conn, restaurant_points_query)
+    except Exception as e:
+        print("Error while executing restaurant_points_query:", e)
+    else:
+        return df
+
+
+@timed_query("district_polygons")
+def load_district_polygons(conn):
+    """
+
+    Helper function that executes district_polygons_query and returns every
+    district polygon (EPSG:32638) as a GeoDataFrame.
+    """
+    try:
+        gdf = read_prepared(conn, district_polygons_query, geom_col="district_geom")
+    except Exception as e:
+        print("Error while executing district_polygons_query:", e)
+    else:
+        return gdf
+
+
+def _scaled(values, log=False):
+    """Min-max scale to 0..1 (optionally on log1p), missing -> 0."""
+    values = pd.to_numeric(values, errors="coerce").astype(float).to_numpy()
+    if log:
+        values = np.log1p(np.clip(values, 0, None))
+    lo, hi = np.nanmin(values, initial=np.inf), np.nanmax(values, initial=-np.inf)
+    if not np.isfinite(lo) or hi <= lo:
+        scaled = np.where(np.isnan(values), 0.0, 1.0)
+    else:
+        scaled = (values - lo) / (hi - lo)
+    return np.nan_to_num(scaled, nan=0.0)
 
-    summary = summary.merge(
-        gate_restaurants_1km_clean,
-        on="gate_id",
-        how="left"
+
+def restaurant_attractiveness(restaurants_df: pd.DataFrame, weights=None) -> np.ndarray:
+    """
+
+    Attractiveness per restaurant from rating, likes, rating_signals and
+    price_code, each scaled to 0..1 over the loaded restaurants (likes /
+    rating_signals on a log scale, price_code inverted so cheaper scores
+    higher). Missing attributes contribute nothing.
+    """
+    weights = {**DEFAULT_ATTRACTIVENESS_WEIGHTS, **(weights or {})}
+    attributes = {
+        "rating": _scaled(restaurants_df["rating"]),
+        "likes": _scaled(restaurants_df["likes"], log=True),
+        "rating_signals": _scaled(restaurants_df["rating_signals"], log=True),
+        "price_code": 1.0 - _scaled(restaurants_df["price_code"]),
+    }
+    # a missing price_code is unknown, not cheap
+    attributes["price_code"][pd.isna(restaurants_df["price_code"]).to_numpy()] = 0.0
+
+    score = np.full(len(restaurants_df), float(weights.get("base", 0.0)))
+    for name, values in attributes.items():
+        score += weights.get(name, 0.0) * values
+    return score
+
+
+def score_points(
+    x,
+    y,
+    restaurants_df: pd.DataFrame,
+    decay: str = "gaussian",
+    bandwidth_m: float = 500.0,
+    cutoff_m: float = None,
+    weights=None,
+    batch_size: int = SCORE_BATCH_SIZE
+) -> pd.DataFrame:
+    """
+
+    Accessibility score for points x / y (EPSG:32638 metres):
+    sum over restaurants within `cutoff_m` of attractiveness * decay(distance).
+
+    Restaurants are pre-filtered to the points' bounding box plus the cutoff
+    and put in an STRtree; each batch of points is one dwithin tree query,
+    and the scores are summed per point with np.bincount.
+    Returns a DataFrame (same order as the points) with
+    `accessibility_score` and `restaurants_in_range`.
+    """
+    if decay not in DECAY_FUNCTIONS:
+        raise ValueError(f"unknown decay {decay!r}, expected one of {list(DECAY_FUNCTIONS)}")
+    decay_fn = DECAY_FUNCTIONS[decay]
+    if cutoff_m is None:
+        cutoff_m = DECAY_CUTOFF_BANDWIDTHS[decay] * bandwidth_m
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    scores = np.zeros(n)
+    counts = np.zeros(n, dtype=np.int64)
+
+    rx = restaurants_df["x"].to_numpy(dtype=float)
+    ry = restaurants_df["y"].to_numpy(dtype=float)
+    attractiveness = restaurant_attractiveness(restaurants_df, weights)
+
+    located = np.isfinite(x) & np.isfinite(y)
+    if n == 0 or not located.any() or len(rx) == 0:
+        return pd.DataFrame({"accessibility_score": scores, "restaurants_in_range": counts})
+
+    # only restaurants that can be within cutoff of some point
+    near = (
+        (rx >= x[located].min() - cutoff_m) & (rx <= x[located].max() + cutoff_m)
+        & (ry >= y[located].min() - cutoff_m) & (ry <= y[located].max() + cutoff_m)
     )
+    rx, ry, attractiveness = rx[near], ry[near], attractiveness[near]
+    tree = shapely.STRtree(shapely.points(rx, ry))
 
-    return summary
+    for start in range(0, n, batch_size):
+        stop = min(start + batch_size, n)
+        points = shapely.points(x[start:stop], y[start:stop])
+        point_idx, restaurant_idx = tree.query(points, predicate="dwithin", distance=cutoff_m)
+
+        dist = np.hypot(x[start:stop][point_idx] - rx[restaurant_idx],
+                        y[start:stop][point_idx] - ry[restaurant_idx])
+        contribution = attractiveness[restaurant_idx] * decay_fn(dist, bandwidth_m)
+        scores[start:stop] = np.bincount(point_idx, weights=contribution, minlength=stop - start)
+        counts[start:stop] = np.bincount(point_idx, minlength=stop - start)
+
+    return pd.DataFrame({"accessibility_score": scores, "restaurants_in_range": counts})
+
+
+def _candidate_xy(candidates, crs):
+    """x / y arrays for candidates given as (Geo)Series/DataFrame or (x, y) pairs."""
+    if isinstance(candidates, (gpd.GeoDataFrame, gpd.GeoSeries)):
+        geoms = candidates.geometry if isinstance(candidates, gpd.GeoDataFrame) else candidates
+        if geoms.crs is not None and crs is not None:
+            geoms = geoms.to_crs(crs)
+        return shapely.get_x(geoms.values), shapely.get_y(geoms.values)
+
+    xy = np.asarray(candidates, dtype=float).reshape(-1, 2)
+    return xy[:, 0], xy[:, 1]
+
+
+def score_gate_accessibility(
+    gates_with_district_gdf: gpd.GeoDataFrame,
+    restaurants_df: pd.DataFrame,
+    candidates=None,
+    decay: str = "gaussian",
+    bandwidth_m: float = 500.0,
+    cutoff_m: float = None,
+    weights=None
+) -> pd.DataFrame:
+    """
+
+    Food accessibility score for every gate and, optionally, for
+    hypothetical `candidates` (a GeoDataFrame / GeoSeries of points, or
+    (x, y) pairs in EPSG:32638), all scored in one batch by score_points.
+
+    Returns one row per point: `point_type` ("gate" / "candidate"),
+    `gate_id` / `gate_name_en` (gates), `candidate_id` (candidates, 0-based
+    position), x / y, `accessibility_score`, `restaurants_in_range`.
+    The gate rows can be passed to build_gate_summary_frame as a provider.
+    """
+    gates = gates_with_district_gdf.drop_duplicates(subset=["gate_id"])
+    gate_x = shapely.get_x(gates.geometry.values)
+    gate_y = shapely.get_y(gates.geometry.values)
+
+    if candidates is None:
+        cand_x = cand_y = np.empty(0)
+    else:
+        cand_x, cand_y = _candidate_xy(candidates, gates.crs)
+
+    x = np.concatenate([gate_x, cand_x])
+    y = np.concatenate([gate_y, cand_y])
+    scores = score_points(x, y, restaurants_df, decay, bandwidth_m, cutoff_m, weights)
+
+    n_gates, n_candidates = len(gates), len(cand_x)
+    points = pd.DataFrame({
+        "point_type": ["gate"] * n_gates + ["candidate"] * n_candidates,
+        "gate_id": pd.array(
+            list(gates["gate_id"]) + [None] * n_candidates, dtype="Int64"
+        ),
+        "gate_name_en": list(gates["gate_name_en"]) + [None] * n_candidates,
+        "candidate_id": pd.array(
+            [None] * n_gates + list(range(n_candidates)), dtype="Int64"
+        ),
+        "x": x,
+        "y": y,
+    })
+    return pd.concat([points, scores], axis=1)
+
+
+@timed_query("restaurants_in_tiles")
+def load_restaurants_in_tiles(conn, tile_deg, tile_xs, tile_ys):
+    """
+
+    Helper function that executes restaurants_in_tiles_query for the map
+    tiles (tile_xs[i], tile_ys[i]) of a `tile_deg` lon / lat grid and returns
+    the restaurants with their tile_x / tile_y, lat and lon.
+    """
+    params = (float(tile_deg), [int(t) for t in tile_xs], [int(t) for t in tile_ys])
+    try:
+        df = read_prepared(conn, restaurants_in_tiles_query, params)
+    except Exception as e:
+        print("Error while executing restaurants_in_tiles_query:", e)
+    else:
+        return df
+
+
+@timed_query("restaurant_snapshots")
+def load_restaurant_snapshots(conn):
+    """
+
+    Helper function that returns the restaurant snapshots (one per ETL run)
+    as a Pandas DataFrame, oldest first.
+    """
+    try:
+        df = read_prepared(conn, restaurant_snapshots_query)
+    except Exception as e:
+        print("Error while executing restaurant_snapshots_query:", e)
+    else:
+        return df
+
+
+@timed_query("gate_snapshot_diff")
+def load_gate_snapshot_diff(conn, snapshot_a, snapshot_b, radius_m=1000):
+    """
+
+    Change of the per-gate restaurant statistics within `radius_m` between
+    two snapshots (counts, opened / closed, average rating, likes / tips),
+    computed by one query over the metric deltas.
+    """
+    params = (int(snapshot_a), int(snapshot_b), float(radius_m))
+    try:
+        df = read_prepared(conn, gate_snapshot_diff_query, params)
+    except Exception as e:
+        print("Error while executing gate_snapshot_diff_query:", e)
+    else:
+        return df
+
+
+@timed_query("district_snapshot_diff")
+def load_district_snapshot_diff(conn, snapshot_a, snapshot_b):
+    """
+
+    Change of the per-district restaurant statistics between two snapshots,
+    computed by one query over the metric deltas.
+    """
+    params = (int(snapshot_a), int(snapshot_b))
+    try:
+        df = read_prepared(conn, district_snapshot_diff_query, params)
+    except Exception as e:
+        print("Error while executing district_snapshot_diff_query:", e)
+    else:
+        return df
+
+
+@timed_query("campus_options")
+def load_campus_options(conn):
+    """
+
+    Helper function that executes campus_options_query and returns the
+    distinct campuses as a Pandas DataFrame (one `campus` column).
+    """
+    try:
+        df = read_prepared(conn, campus_options_query)
+    except Exception as e:
+        print("Error while executing campus_options_query:", e)
+    else:
+        return df
+
+
+@timed_query("gate_name_options")
+def load_gate_name_options(conn, campus=ALL_OPTION):
+    """
+
+    Helper function that returns the gate names available for the selected
+    campus as a Pandas DataFrame (one `gate_name_en` column).
+    """
+    sql, params = build_gate_name_options_query(campus)
+    try:
+        df = read_prepared(conn, sql, params)
+    except Exception as e:
+        print("Error while executing gate_name_options_query:", e)
+    else:
+        return df
+
+
+@timed_query("filtered_gate_summary")
+def load_filtered_gate_summary(conn, campus=ALL_OPTION, gate_name=ALL_OPTION):
+    """
+
+    Helper function that builds the gate summary for the sidebar filters in
+    the database (filtered_gate_summary_query) instead of filtering the full
+    frame in pandas. Rows carry `lat` / `lon` so the map needs no reprojection.
+    """
+    sql, params = build_filtered_gate_summary_query(campus, gate_name)
+    try:
+        df = read_prepared(conn, sql, params)
+    except Exception as e:
+        print("Error while executing filtered_gate_summary_query:", e)
+    else:
+        return df
 
 
 def main():
@@ -139,8 +618,10 @@ def main():
       and 1 km stats.
     - Computes the nearest restaurant per gate.
     - Builds a gate-level summary table.
+    - Scores gate food accessibility (distance-decayed attractiveness).
     - Prints some basic previews for quick inspection.
     """
+    setup_from_env()
     conn, cur = get_connection()
     
 
@@ -149,6 +630,7 @@ def main():
         gates_with_district_gdf = load_gates_with_district(conn)
         gate_restaurant_distances_df = load_gate_restaurant_distances(conn)
         gate_restaurants_1km_df = load_gate_restaurants_1km(conn)
+        restaurant_points_df = load_restaurant_points(conn)
 
         
         nearest_df = get_nearest_restaurant_per_gate(gate_restaurant_distances_df)
@@ -181,6 +663,15 @@ def main():
                            .head()
         )
 
+        print("\n=== Gates by food accessibility score ===")
+        accessibility_df = score_gate_accessibility(
+            gates_with_district_gdf, restaurant_points_df
+        )
+        print(
+            accessibility_df.sort_values("accessibility_score", ascending=False)
+                            .head()
+        )
+
     finally:
         cur.close()
         conn.close()
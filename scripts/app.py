@@ -2,29 +2,29 @@
 Streamlit app for exploring KSU + Riyadh restaurants spatial analysis.
 
 This app relies on:
-- create_tables.get_connection
-- analysis.py helpers:
-    - load_district_stats
-    - load_gates_with_district
-    - load_gate_restaurant_distances
-    - load_gate_restaurants_1km
-    - get_nearest_restaurant_per_gate
-    - build_gate_summary
+- query_service.get_query_service (shared, coalescing query layer that runs
+  the analysis.py loaders)
+- spatial_cache (memory-mapped on-disk copy of the analysis outputs;
+  build_cached_frames runs the analysis.py helpers
+  get_nearest_restaurant_per_gate and build_gate_summary)
+- tile_cache (per-tile cache for the "restaurants in view" map)
 """
 
+import math
+
 import streamlit as st
-import pandas as pd
 import geopandas as gpd
 
-from create_tables import get_connection
-from analysis import (
-    load_district_stats,
-    load_gates_with_district,
-    load_gate_restaurant_distances,
-    load_gate_restaurants_1km,
-    get_nearest_restaurant_per_gate,
-    build_gate_summary,
-)
+from riyadh_ksu_geo.query_service import get_query_service
+from riyadh_ksu_geo.spatial_cache import (PIPELINE_QUERIES,
+                                          build_cached_frames,
+                                          load_cached_frames)
+from riyadh_ksu_geo.tile_cache import get_restaurant_tile_cache
+from riyadh_ksu_geo.telemetry import setup_from_env, traced
+
+# metrics / traces when GEO_METRICS* is set (the /metrics server starts once
+# per process, reruns are no-ops)
+setup_from_env()
 
 # -------------------------------------------------------------------
 # Page config
@@ -39,17 +39,38 @@ st.set_page_config(
 # -------------------------------------------------------------------
 # Data loading (cached)
 # -------------------------------------------------------------------
-@st.cache_data(show_spinner=True)
+@traced("app.run_analysis_pipeline")
+def run_analysis_pipeline():
+    """
+    Run the full analysis pipeline against the database.
+
+    The four queries go through the shared query service, so when many
+    sessions miss the caches at the same time the database still runs each
+    query once. Returns None when one of the queries failed.
+    """
+    return build_cached_frames(get_query_service().get_many(PIPELINE_QUERIES))
+
+
+@st.cache_resource(show_spinner=True, ttl=60)
 def load_all_data():
     """
-    Run the full analysis pipeline once and cache the results.
+    Load the analysis tables from the memory-mapped spatial cache, running
+    the pipeline (and refreshing the cache) only when it is missing or stale.
+
+    cache_resource hands every session the same objects (no pickling), and
+    numeric columns stay memory-mapped, so Streamlit worker processes share
+    the cached pages. Geometry columns are not materialised here; use
+    spatial_cache.open_frame(name).to_geopandas() where a view needs them.
+
+    Returns None when the pipeline failed. That result is cached too, so a
+    failing database is retried once per ttl, not on every rerun.
 
     Returns
     -------
-    districts_stats_gdf : GeoDataFrame
+    districts_stats_gdf : DataFrame
         District-level stats (density, avg rating, etc.).
-    gates_with_district_gdf : GeoDataFrame
-        Gate locations with district attributes.
+    gates_with_district_gdf : DataFrame
+        Gate locations (lat / lon) with district attributes.
     gate_restaurant_distances_df : DataFrame
         All (gate, restaurant) pairs with distances.
     gate_restaurants_1km_df : DataFrame
@@ -59,35 +80,14 @@ def load_all_data():
     gate_summary_df : DataFrame
         Final gate-level summary (gate + district + nearest + 1km stats).
     """
-    conn, cur = get_connection()
-    try:
-        districts_stats_gdf = load_district_stats(conn)
-        gates_with_district_gdf = load_gates_with_district(conn)
-        gate_restaurant_distances_df = load_gate_restaurant_distances(conn)
-        gate_restaurants_1km_df = load_gate_restaurants_1km(conn)
-        nearest_df = get_nearest_restaurant_per_gate(
-            gate_restaurant_distances_df
-        )
-        gate_summary_df = build_gate_summary(
-            gates_with_district_gdf,
-            nearest_df,
-            gate_restaurants_1km_df,
-        )
-    finally:
-        cur.close()
-        conn.close()
-
-    return (
-        districts_stats_gdf,
-        gates_with_district_gdf,
-        gate_restaurant_distances_df,
-        gate_restaurants_1km_df,
-        nearest_df,
-        gate_summary_df,
-    )
+    return load_cached_frames(run_analysis_pipeline)
 
 
 # Load everything (from cache after first run)
+all_data = load_all_data()
+if all_data is None:
+    st.error("Error while loading the analysis data.")
+    st.stop()
 (
     districts_stats_gdf,
     gates_with_district_gdf,
@@ -95,7 +95,7 @@ def load_all_data():
     gate_restaurants_1km_df,
     nearest_df,
     gate_summary_df,
-) = load_all_data()
+) = all_data
 
 
 # -------------------------------------------------------------------
@@ -103,42 +103,40 @@ def load_all_data():
 # -------------------------------------------------------------------
 st.sidebar.title("Filters")
 
+# Filters are answered by parameterised queries (see query_builder.py),
+# cached by the query service per filter tuple, instead of re-filtering
+# the full gate_summary_df on every widget interaction.
+query_service = get_query_service()
+
 # Campus filter
-campus_options = (
-    ["All"]
-    + sorted(
-        [c for c in gate_summary_df["campus"].dropna().unique().tolist()]
-    )
-)
+campus_options_df = query_service.get("campus_options")
+if campus_options_df is None:
+    st.error("Error while loading the campus filter.")
+    st.stop()
+campus_options = ["All"] + campus_options_df["campus"].tolist()
 campus_selected = st.sidebar.selectbox(
     "Select campus", campus_options, index=0
 )
 
-# Filter by campus
-filtered_gate_summary = gate_summary_df.copy()
-if campus_selected != "All":
-    filtered_gate_summary = filtered_gate_summary[
-        filtered_gate_summary["campus"] == campus_selected
-    ]
-
 # Gate filter (depends on campus filter)
-gate_name_options = (
-    ["All"]
-    + sorted(
-        filtered_gate_summary["gate_name_en"]
-        .dropna()
-        .unique()
-        .tolist()
-    )
+gate_name_options_df = query_service.get(
+    "gate_name_options", (campus_selected,)
 )
+if gate_name_options_df is None:
+    st.error("Error while loading the gate filter.")
+    st.stop()
+gate_name_options = ["All"] + gate_name_options_df["gate_name_en"].tolist()
 gate_selected = st.sidebar.selectbox(
     "Select gate", gate_name_options, index=0
 )
 
-if gate_selected != "All":
-    filtered_gate_summary = filtered_gate_summary[
-        filtered_gate_summary["gate_name_en"] == gate_selected
-    ]
+filtered_gate_summary = query_service.get(
+    "filtered_gate_summary", (campus_selected, gate_selected)
+)
+
+if filtered_gate_summary is None:
+    st.error("Error while loading the filtered gate summary.")
+    st.stop()
 
 st.sidebar.markdown("---")
 st.sidebar.write("Rows after filter:", len(filtered_gate_summary))
@@ -282,36 +280,13 @@ with tab_gates:
 
         st.markdown("---")
 
-                # --- Map of gates ---
+        # --- Map of gates ---
         st.markdown("### Gates map")
 
         try:
-            # Make sure we're using the right geometry column (gate_geom)
-            gates_map_gdf = (
-                gates_with_district_gdf
-                .set_geometry("gate_geom")   # tell GeoPandas which column is geometry
-                .to_crs(epsg=4326)           # reproject to WGS84 for web maps
-                .copy()
-            )
-
-            # Extract lat/lon from geometry
-            gates_map_gdf["lat"] = gates_map_gdf.geometry.y
-            gates_map_gdf["lon"] = gates_map_gdf.geometry.x
-
-            # Merge summary info (restaurants_1km / dist_km) onto gates for context
-            gates_map_df = pd.merge(
-                gates_map_gdf.drop(columns=["gate_geom"]),   # <- was "geometry" before
-                gate_summary_df[["gate_id", "restaurants_1km", "dist_km"]],
-                on="gate_id",
-                how="left",
-            )
-
-            # Apply same campus/gate filters used in the table
-            map_df = gates_map_df.copy()
-            if campus_selected != "All":
-                map_df = map_df[map_df["campus"] == campus_selected]
-            if gate_selected != "All":
-                map_df = map_df[map_df["gate_name_en"] == gate_selected]
+            # filtered_gate_summary already carries WGS84 lat/lon and the
+            # summary columns, so no reprojection or merge per rerun
+            map_df = filtered_gate_summary
 
             if len(map_df) == 0:
                 st.info("No gate points to display for current filters.")
@@ -324,6 +299,37 @@ with tab_gates:
         except Exception as e:
             st.error(f"Error while preparing map: {e}")
 
+        # --- Restaurants in the current view ---
+        st.markdown("### Restaurants in view")
+
+        # the viewport is the filtered gates' extent plus a margin; every
+        # filter / margin change is a new bbox, answered from cached tiles
+        # plus one query for the tiles not seen before
+        margin_km = st.slider("View margin around gates (km)", 0.5, 10.0, 1.0, 0.5)
+        margin_lat = margin_km / 111.32
+        margin_lon = margin_km / (111.32 * math.cos(math.radians(
+            filtered_gate_summary["lat"].mean()
+        )))
+
+        tile_cache = get_restaurant_tile_cache()
+        view_df = tile_cache.query(
+            filtered_gate_summary["lon"].min() - margin_lon,
+            filtered_gate_summary["lat"].min() - margin_lat,
+            filtered_gate_summary["lon"].max() + margin_lon,
+            filtered_gate_summary["lat"].max() + margin_lat,
+        )
+
+        if view_df is None:
+            st.error("Error while loading restaurants for the current view.")
+        elif len(view_df) == 0:
+            st.info("No restaurants in the current view.")
+        else:
+            st.write("Restaurants in view:", len(view_df))
+            st.map(view_df[["lat", "lon"]], zoom=None)
+
+        with st.expander("Tile cache statistics"):
+            st.json(tile_cache.stats())
+
 
 
 # -------------------------------------------------------------------
@@ -0,0 +1,95 @@
+"""
+Benchmark: gate summary built by chained merges vs one aligned build.
+
+merge chain : the previous build_gate_summary approach, drop geometry,
+              drop_duplicates, then one left merge per metric set
+aligned     : analysis.build_gate_summary_frame, every metric set aligned to
+              the gates with one index lookup + positional takes, frame
+              constructed once
+
+Runs on synthetic gates and metric sets (e.g. several radii / categories),
+no database needed:
+
+    python scripts/bench_gate_summary.py
+"""
+
+import timeit
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+
+from riyadh_ksu_geo.analysis import build_gate_summary_frame
+
+
+GATE_COUNTS = [1_000, 10_000, 100_000]
+METRIC_SET_COUNTS = [2, 8, 24]
+REPEATS = 3
+
+
+def make_inputs(n_gates, n_metric_sets, seed=7):
+    rng = np.random.default_rng(seed)
+    gates_gdf = gpd.GeoDataFrame(
+        {
+            "gate_id": np.arange(1, n_gates + 1),
+            "gate_name_en": [f"Gate {i}" for i in range(1, n_gates + 1)],
+            "campus": rng.choice(["main_male", "female", "medical_city"], n_gates),
+            "district_name_en": rng.choice(["AR-RIMAL", "AL-YARMUK"], n_gates),
+        },
+        geometry=gpd.points_from_xy(
+            rng.uniform(660_000, 690_000, n_gates),
+            rng.uniform(2_730_000, 2_790_000, n_gates),
+        ),
+        crs="EPSG:32638",
+    ).rename_geometry("gate_geom")
+
+    metric_sets = []
+    for i in range(n_metric_sets):
+        # providers come back in their own (query) order
+        order = rng.permutation(n_gates)
+        metric_sets.append(pd.DataFrame({
+            "gate_id": gates_gdf["gate_id"].to_numpy()[order],
+            f"restaurants_{i}": rng.integers(0, 80, n_gates),
+            f"avg_rating_{i}": rng.uniform(5, 9, n_gates),
+        }))
+    return gates_gdf, metric_sets
+
+
+def build_gate_summary_merge_chain(gates_gdf, metric_sets):
+    summary = gates_gdf.drop(columns=["gate_geom"])
+    summary = summary.drop_duplicates(subset=["gate_id"])
+    for metrics in metric_sets:
+        summary = summary.merge(metrics, on="gate_id", how="left")
+    return summary
+
+
+def build_gate_summary_aligned(gates_gdf, metric_sets):
+    return build_gate_summary_frame(gates_gdf, metric_sets).reset_index()
+
+
+def main():
+    print(f"{'gates':>8} {'metric sets':>12} {'merge chain (ms)':>17} "
+          f"{'aligned (ms)':>13} {'speedup':>8}")
+    for n_gates in GATE_COUNTS:
+        for n_metric_sets in METRIC_SET_COUNTS:
+            gates_gdf, metric_sets = make_inputs(n_gates, n_metric_sets)
+
+            pd.testing.assert_frame_equal(
+                build_gate_summary_merge_chain(gates_gdf, metric_sets),
+                build_gate_summary_aligned(gates_gdf, metric_sets),
+            )
+
+            merge_chain = min(timeit.repeat(
+                lambda: build_gate_summary_merge_chain(gates_gdf, metric_sets),
+                number=1, repeat=REPEATS,
+            ))
+            aligned = min(timeit.repeat(
+                lambda: build_gate_summary_aligned(gates_gdf, metric_sets),
+                number=1, repeat=REPEATS,
+            ))
+            print(f"{n_gates:>8} {n_metric_sets:>12} {merge_chain * 1e3:>17.2f} "
+                  f"{aligned * 1e3:>13.2f} {merge_chain / aligned:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
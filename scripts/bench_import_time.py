@@ -0,0 +1,117 @@
+"""
+Benchmark: startup (import) cost of each console command.
+
+Every command's import chain runs in a fresh interpreter with
+`python -X importtime`, REPEATS times; the fastest run is reported with the
+heaviest direct imports, e.g.
+
+    command        total (ms)  heaviest imports
+    geo-create           50.2  psycopg2 43.8, configparser 2.8, sql_queries 0.3
+
+Budgets make it usable as a regression check (exit code 1 when exceeded):
+
+    python scripts/bench_import_time.py --budget geo-create=150 --json import_times.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPEATS = 3
+TOP_IMPORTS = 4
+
+# command -> modules imported before its main() runs (see cli.py)
+COMMAND_IMPORTS = {
+    "geo-create": ["riyadh_ksu_geo.cli", "riyadh_ksu_geo.create_tables"],
+    "geo-etl": ["riyadh_ksu_geo.cli", "riyadh_ksu_geo.etl"],
+    "geo-analyze": ["riyadh_ksu_geo.cli", "riyadh_ksu_geo.analysis"],
+    "geo-app": ["riyadh_ksu_geo.cli", "streamlit.web.cli"],
+}
+
+
+def parse_importtime(stderr):
+    """[(depth, name, cumulative_us), ...] from -X importtime output."""
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        entries.append((depth, name.strip(), int(cumulative)))
+    return entries
+
+
+def measure(modules):
+    """Total import time (ms) of `modules` and their heaviest direct imports."""
+    code = "; ".join(f"import {module}" for module in modules)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=PROJECT_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    # -X importtime lists children before their parent; interpreter startup
+    # imports (site, .pth hooks) are top-level entries of their own and are
+    # not counted
+    total_ms, direct, children = 0.0, [], []
+    for depth, name, us in parse_importtime(result.stderr):
+        if depth == 1:
+            children.append((name, us / 1000))
+        elif depth == 0:
+            if name in modules:
+                total_ms += us / 1000
+                direct.extend(children)
+            children = []
+    direct.sort(key=lambda item: item[1], reverse=True)
+    return total_ms, direct[:TOP_IMPORTS]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=REPEATS)
+    parser.add_argument("--budget", action="append", default=[],
+                        metavar="COMMAND=MS", help="fail when COMMAND imports slower")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    budgets = {}
+    for budget in args.budget:
+        command, ms = budget.split("=")
+        budgets[command] = float(ms)
+
+    results = {}
+    print(f"{'command':<14} {'total (ms)':>10}  heaviest imports")
+    for command, modules in COMMAND_IMPORTS.items():
+        try:
+            runs = [measure(modules) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f"{command:<14} {'—':>10}  not importable: {e}")
+            continue
+        total_ms, heaviest = min(runs, key=lambda run: run[0])
+        results[command] = {"total_ms": round(total_ms, 1),
+                            "heaviest": [[name, round(ms, 1)] for name, ms in heaviest]}
+        print(f"{command:<14} {total_ms:>10.1f}  "
+              + ", ".join(f"{name} {ms:.1f}" for name, ms in heaviest))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    over = [
+        command for command, ms in budgets.items()
+        if command in results and results[command]["total_ms"] > ms
+    ]
+    if over:
+        print("Error: import time over budget for:", over)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark: gates map preparation with and without runtime reprojection,
+end to end against the database (query round trip included).
+
+before : the gates query before geom_4326, read as a GeoDataFrame
+         -> to_crs(4326) -> extract lat/lon -> filter
+after  : the same query reading lat/lon from the stored geom_4326 column
+         (as gates_with_district_query / filtered_gate_summary_query do)
+         -> filter
+
+Both sides run on the same connection, through the same reader
+(query_stream.read_prepared), over the same synthetic gates around KSU. The
+gates go into a temp table with the same geom / geom_4326 columns as
+ksu_gates, joined to the loaded districts; nothing is written to the
+real tables. Needs config/db.cfg and a database with the districts loaded:
+
+    python scripts/bench_map_prep.py
+"""
+
+import timeit
+
+import numpy as np
+
+from riyadh_ksu_geo.create_tables import get_connection
+from riyadh_ksu_geo.query_stream import read_prepared
+
+
+GATE_COUNTS = [10, 1_000, 100_000]
+REPEATS = 5
+CAMPUS = "female"
+
+
+create_bench_gates = """
+DROP TABLE IF EXISTS bench_gates;
+CREATE TEMP TABLE bench_gates (
+    gate_id INT PRIMARY KEY,
+    gate_name_en TEXT,
+    campus TEXT,
+    geom geometry(Point, 32638),
+    geom_4326 geometry(Point, 4326)
+        GENERATED ALWAYS AS (ST_Transform(geom, 4326)) STORED
+);
+INSERT INTO bench_gates (gate_id, gate_name_en, campus, geom)
+SELECT
+    i,
+    'Gate ' || i,
+    (ARRAY['main_male', 'female', 'medical_city'])[1 + i % 3],
+    ST_Transform(ST_SetSRID(ST_MakePoint(
+        46.62 + (random() - 0.5) * 0.08,
+        24.72 + (random() - 0.5) * 0.08
+    ), 4326), 32638)
+FROM generate_series(1, %s) AS i;
+ANALYZE bench_gates;
+"""
+
+# gates_with_district_query before geom_4326: only the metric geometry
+gates_before_query = """
+SELECT
+    gate_id,
+    gate_name_en,
+    campus,
+    g.geom AS gate_geom,
+    district_id,
+    district_name_en
+FROM
+bench_gates g LEFT JOIN districts
+ON
+ST_Contains(districts.geom, g.geom)
+ORDER BY gate_id;
+"""
+
+# gates_with_district_query now: display coordinates from geom_4326
+gates_after_query = """
+SELECT
+    gate_id,
+    gate_name_en,
+    campus,
+    ST_Y(g.geom_4326) AS lat,
+    ST_X(g.geom_4326) AS lon,
+    district_id,
+    district_name_en
+FROM
+bench_gates g LEFT JOIN districts
+ON
+ST_Contains(districts.geom, g.geom)
+ORDER BY gate_id;
+"""
+
+
+def prepare_map_before(conn, campus):
+    gates_map_gdf = read_prepared(conn, gates_before_query, geom_col="gate_geom")
+    gates_map_gdf = gates_map_gdf.to_crs(epsg=4326)
+    gates_map_gdf["lat"] = gates_map_gdf.geometry.y
+    gates_map_gdf["lon"] = gates_map_gdf.geometry.x
+    map_df = gates_map_gdf[gates_map_gdf["campus"] == campus]
+    return map_df[["lat", "lon"]]
+
+
+def prepare_map_after(conn, campus):
+    gates_map_df = read_prepared(conn, gates_after_query)
+    map_df = gates_map_df[gates_map_df["campus"] == campus]
+    return map_df[["lat", "lon"]]
+
+
+def main():
+    conn, cur = get_connection()
+    try:
+        print(f"{'gates':>8} {'before (ms)':>12} {'after (ms)':>11} {'speedup':>8}")
+        for n in GATE_COUNTS:
+            cur.execute(create_bench_gates, (n,))
+            conn.commit()
+
+            before_df = prepare_map_before(conn, CAMPUS)
+            after_df = prepare_map_after(conn, CAMPUS)
+            # same points either way (ST_Transform in the database vs pyproj)
+            assert np.allclose(before_df.to_numpy(dtype=float),
+                               after_df.to_numpy(dtype=float), atol=1e-7)
+
+            before = min(timeit.repeat(
+                lambda: prepare_map_before(conn, CAMPUS),
+                number=1, repeat=REPEATS,
+            ))
+            after = min(timeit.repeat(
+                lambda: prepare_map_after(conn, CAMPUS),
+                number=1, repeat=REPEATS,
+            ))
+            print(f"{n:>8} {before * 1e3:>12.2f} {after * 1e3:>11.2f} "
+                  f"{before / after:>7.1f}x")
+    finally:
+        cur.close()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Console entry points (declared in pyproject.toml [project.scripts]).
+
+    geo-create   -> create_tables.main   (drop + create the tables)
+    geo-etl      -> etl.main             (load the data files)
+    geo-analyze  -> analysis.main        (print the analysis previews)
+    geo-app      -> streamlit run app.py (extra arguments go to streamlit)
+
+This module imports nothing heavy: each command imports only the module it
+runs, when it runs, so e.g. geo-create never loads pandas / geopandas /
+streamlit. Check the startup cost with scripts/bench_import_time.py.
+"""
+
+import importlib
+import importlib.util
+import sys
+
+
+PACKAGE = "riyadh_ksu_geo"
+
+
+def _run(module_name):
+    module = importlib.import_module(f"{PACKAGE}.{module_name}")
+    return module.main()
+
+
+def create():
+    _run("create_tables")
+
+
+def etl():
+    _run("etl")
+
+
+def analyze():
+    _run("analysis")
+
+
+def app_path():
+    """Path of app.py, found without importing it (that would run the app)."""
+    spec = importlib.util.find_spec(f"{PACKAGE}.app")
+    if spec is None or spec.origin is None:
+        raise FileNotFoundError(f"{PACKAGE}.app not found on the module path")
+    return spec.origin
+
+
+def app():
+    try:
+        from streamlit.web import cli as streamlit_cli
+    except ImportError:
+        print("Error: geo-app needs streamlit (pip install streamlit)")
+        sys.exit(1)
+
+    sys.argv = ["streamlit", "run", app_path(), *sys.argv[1:]]
+    sys.exit(streamlit_cli.main())
@@ -1,54 +1,77 @@
 # adding needed imports
+import os
+import sys
 import psycopg2
-from sql_queries import drop_table_queries,create_table_queries
+from riyadh_ksu_geo.sql_queries import drop_table_queries,create_table_queries,create_restaurants_partition
 import configparser
-import streamlit as st
 
 
-def get_connection():
+DB_CONFIG_PATH = os.path.join("config", "db.cfg")
+
+
+def _streamlit_secrets():
     """
-    
-    a helper function will read DB parameters from db.cfg || streemlit and return connection and cursior
+    db_credentials from st.secrets, only when running inside Streamlit
+    (streamlit already imported), so CLI scripts never pay for importing it.
     """
-
+    if "streamlit" not in sys.modules:
+        return None
     try:
-        if "db_credentials" in st.secrets:
-            secrets = st.secrets["db_credentials"]
-            conn = psycopg2.connect(
-                dbname=secrets["dbname"],
-                host=secrets["host"],
-                user=secrets["user"],
-                password=secrets["password"],
-                port=secrets["port"]
-            )
-            return conn, conn.cursor()
+        secrets = sys.modules["streamlit"].secrets
+        if "db_credentials" in secrets:
+            return secrets["db_credentials"]
     except Exception:
         pass
-    
+    return None
+
+
+def get_connection_params():
+    """
+
+    a helper function will read DB parameters from streamlit secrets (inside the app) || db.cfg
+    and return them as a dict of psycopg2.connect keyword arguments.
+    The db.cfg path can be overridden with the GEO_DB_CONFIG environment variable.
+    """
+
+    secrets = _streamlit_secrets()
+    if secrets is not None:
+        return {
+            "dbname": secrets["dbname"],
+            "host": secrets["host"],
+            "user": secrets["user"],
+            "password": secrets["password"],
+            "port": secrets["port"]
+        }
+
     config = configparser.ConfigParser()
-    config.read('config/db.cfg')
+    config.read(os.environ.get("GEO_DB_CONFIG", DB_CONFIG_PATH))
+
+    return {
+        "dbname": config.get("postgresql" , "dbname"),
+        "host": config.get("postgresql" , "host"),
+        "user": config.get("postgresql" , "user"),
+        "password": config.get("postgresql" , "password"),
+        "port": config.get("postgresql" , "port")
+    }
 
-    db_host = config.get("postgresql" , "host")
-    db_name = config.get("postgresql" , "dbname")
-    db_user = config.get("postgresql" , "user")
-    db_password = config.get("postgresql" , "password")
-    db_port = config.get("postgresql" , "port")
+
+def get_connection():
+    """
+    
+    a helper function will read DB parameters from db.cfg || streemlit and return connection and cursior
+    """
+
+    params = get_connection_params()
 
     try:
-        conn = psycopg2.connect(
-        dbname = db_name,
-        host = db_host, 
-        user = db_user,
-        port = db_port,
-        password = db_password
-        )
+        conn = psycopg2.connect(**params)
         cur = conn.cursor()
 
     except psycopg2.DatabaseError as e:
         print("Error" , e)
     
     else:
-        print(f"connection to {db_name} is done!")
+        print(f"connection to {params['dbname']} is done!")
         return conn , cur
 
     
@@ -87,6 +110,25 @@ def create_tables(cur , conn):
         print("creating all tables is done!")
 
 
+def create_restaurant_partitions(cur , conn , municipality_codes):
+    """
+    this method creates one restaurants partition per municipality code
+    (codes that already have a partition are skipped, -1 stays in the default partition)
+    cur will excuate the query , conn will commit the changes to the database
+    """
+    try:
+        for code in sorted({int(code) for code in municipality_codes}):
+            if code < 0:
+                continue
+            cur.execute(create_restaurants_partition.format(code=code))
+        conn.commit()
+    except psycopg2.OperationalError as e:
+        print("Error:" , e)
+
+    else:
+        print("creating restaurants partitions is done!")
+
+
 def main():
     conn , cur = get_connection()
     drop_tables(cur , conn)
@@ -1,11 +1,27 @@
 # adding needed imports
+import argparse
+import hashlib
+import os
+import time
 import psycopg2
 import geopandas as gpd
 import pandas as pd
-from create_tables import get_connection
-from sql_queries import insert_into_districts_table,insert_into_restaurants_table,insert_into_ksu_gates_table
+from riyadh_ksu_geo.create_tables import get_connection,create_restaurant_partitions
+from riyadh_ksu_geo.sql_queries import insert_into_districts_table,insert_into_ksu_gates_table
+from riyadh_ksu_geo.sql_queries import (insert_into_restaurant_snapshots_table,
+                                        create_restaurants_staging_table,
+                                        insert_into_restaurants_staging_table,
+                                        insert_closed_restaurant_deltas,
+                                        insert_changed_restaurant_metric_deltas,
+                                        update_restaurants_from_staging,
+                                        insert_new_restaurants_from_staging,
+                                        update_restaurant_snapshot_count)
+from riyadh_ksu_geo.sql_queries import select_districts_for_assignment
+from riyadh_ksu_geo.validation import validate_districts,validate_restaurants,validate_ksu_gates,write_quarantine
+from riyadh_ksu_geo.telemetry import record_load,setup_from_env,span,traced
 
 
+@traced("etl.load_districts")
 def load_districts(file_path , conn , cur):
     """
     Load Riyadh district polygones from a GeoJSON file into the districts table.
@@ -24,11 +40,14 @@ def load_districts(file_path , conn , cur):
             "HASRIYADH" : "has_riyadh"
         }
         gdf = gdf.rename(columns=column_names_mapper)
+        gdf, rejected = validate_districts(gdf)
+        write_quarantine(rejected, "districts")
         gdf["area_m2"] = gdf.geometry.area
         gdf["area_km2"] = gdf["area_m2"] / 10 ** 6
         gdf["has_riyadh"] = gdf["has_riyadh"].apply(lambda num : True if num == 1 else False)
         
         try:
+            start = time.perf_counter()
             for row in gdf.itertuples(index=False):
                 cur.execute(
                     insert_into_districts_table,
@@ -50,6 +69,7 @@ def load_districts(file_path , conn , cur):
         except psycopg2.OperationalError as e:
             print("Error inserting into districts table:" , e)
         else:
+            record_load("districts", len(gdf), time.perf_counter() - start, len(rejected))
             print("loading to districts table is done!")
 
     except FileNotFoundError as e:
@@ -57,9 +77,65 @@ def load_districts(file_path , conn , cur):
 
 
 
-def load_restaurants(file_path , conn , cur):
+UNASSIGNED_MUNICIPALITY_CODE = -1
+
+
+def assign_districts(gdf , conn):
+    """
+    Attach district_id / municipality_code of the containing district to each
+    restaurant (vectorized spatial join against the loaded districts table).
+    Restaurants outside every district get UNASSIGNED_MUNICIPALITY_CODE.
+    """
+    districts_gdf = gpd.read_postgis(
+        sql = select_districts_for_assignment,
+        con = conn,
+        geom_col = "geom"
+    )
+    joined = gpd.sjoin(
+        gdf,
+        districts_gdf[["district_id", "municipality_code", "geom"]],
+        how="left",
+        predicate="within"
+    )
+    # a point on a shared border matches two districts: keep the first one
+    joined = joined[~joined.index.duplicated(keep="first")]
+
+    gdf["district_id"] = joined["district_id"].astype("Int64").astype(object).where(
+        joined["district_id"].notna(), None
+    )
+    gdf["municipality_code"] = (
+        joined["municipality_code"]
+        .fillna(UNASSIGNED_MUNICIPALITY_CODE)
+        .astype(int)
+    )
+    return gdf
+
+
+def add_source_keys(gdf):
+    """
+    Stable identity of a restaurant across snapshots: md5 of its name and
+    EPSG:32638 coordinates rounded to 1 m. Repeated (name, location) pairs
+    in one file are numbered in file order so every row keeps its own key.
     """
-    Load restrunts from a GeoJSON file into the restaurants table.
+    base = (
+        gdf["name"].fillna("").astype(str)
+        + "|" + gdf.geometry.x.round().astype(int).astype(str)
+        + "|" + gdf.geometry.y.round().astype(int).astype(str)
+    )
+    occurrence = base.groupby(base).cumcount()
+    base = base.where(occurrence == 0, base + "#" + (occurrence + 1).astype(str))
+    gdf["source_key"] = base.map(lambda key: hashlib.md5(key.encode("utf-8")).hexdigest())
+    return gdf
+
+
+@traced("etl.load_restaurants")
+def load_restaurants(file_path , conn , cur , label=None):
+    """
+    Load restrunts from a GeoJSON file as a new restaurant snapshot,
+    one partition per municipality.
+    Restaurants already known (same source_key) keep their row and geometry,
+    metric changes and restaurants that disappear / come back are recorded
+    in restaurant_metric_deltas.
     """
     try:
         gdf = gpd.read_file(file_path)
@@ -71,11 +147,27 @@ def load_restaurants(file_path , conn , cur):
         }
 
         gdf = gdf.rename(columns=columns_names_mapper)
+        gdf, rejected = validate_restaurants(gdf)
+        write_quarantine(rejected, "restaurants")
+        gdf = assign_districts(gdf, conn)
+        gdf = add_source_keys(gdf)
+        create_restaurant_partitions(cur, conn, gdf["municipality_code"].unique())
         try:
+            start = time.perf_counter()
+            cur.execute(
+                insert_into_restaurant_snapshots_table,
+                (label or os.path.basename(file_path), file_path)
+            )
+            snapshot_id = cur.fetchone()[0]
+
+            cur.execute(create_restaurants_staging_table)
             for row in gdf.itertuples(index=False):
                 cur.execute(
-                    insert_into_restaurants_table,
+                    insert_into_restaurants_staging_table,
                     (
+                    row.district_id,
+                    row.municipality_code,
+                    row.source_key,
                     row.name,
                     row.categories,
                     row.address,
@@ -90,15 +182,30 @@ def load_restaurants(file_path , conn , cur):
                     row.geometry.wkt,  
                     )
                 )
+
+            # order matters: deltas are computed against the previous values
+            snapshot = {"snapshot_id": snapshot_id}
+            cur.execute(insert_closed_restaurant_deltas, snapshot)
+            closed = cur.rowcount
+            cur.execute(insert_changed_restaurant_metric_deltas, snapshot)
+            changed = cur.rowcount
+            cur.execute(update_restaurants_from_staging, snapshot)
+            cur.execute(insert_new_restaurants_from_staging, snapshot)
+            added = cur.rowcount
+            cur.execute(update_restaurant_snapshot_count, snapshot)
             conn.commit()
         except psycopg2.OperationalError as e :
+            conn.rollback()
             print("Error inserting into restaurants table:" , e)
         else:
-            print("loading to restaurants table is done!")
+            record_load("restaurants", len(gdf), time.perf_counter() - start, len(rejected))
+            print(f"loading to restaurants table is done! snapshot {snapshot_id}: "
+                  f"{added} new, {changed} changed or back, {closed} gone")
     except FileNotFoundError as e:
         print("Error reading restrunat file:" , e)
 
 
+@traced("etl.load_ksu_gates")
 def load_ksu_gates(file_path, conn, cur):
     """
     Load KSU gates from a CSV file into the ksu_gates table.
@@ -112,8 +219,11 @@ def load_ksu_gates(file_path, conn, cur):
             crs="EPSG:4326"
         )
         gdf.to_crs("EPSG:32638", inplace=True)
+        gdf, rejected = validate_ksu_gates(gdf)
+        write_quarantine(rejected, "ksu_gates")
 
         try:
+            start = time.perf_counter()
             for row in gdf.itertuples(index=False):
                 cur.execute(
                     insert_into_ksu_gates_table,
@@ -135,6 +245,7 @@ def load_ksu_gates(file_path, conn, cur):
             print("Error inserting into ksu_gates:", e)
         
         else:
+            record_load("ksu_gates", len(gdf), time.perf_counter() - start, len(rejected))
             print("loading to ksu_gates is done!")
 
     except FileNotFoundError as e:
@@ -143,13 +254,22 @@ def load_ksu_gates(file_path, conn, cur):
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Load the data files into PostGIS.")
+    parser.add_argument("--restaurants", metavar="PATH",
+                        help="only load this restaurants file as a new snapshot")
+    parser.add_argument("--label", help="snapshot label (default: file name)")
+    args = parser.parse_args()
+    setup_from_env()
    
     conn, cur = get_connection()
    
-
-    load_districts("data/districts_sample_200.geojson", conn, cur)
-    load_restaurants("data/restaurants_sample_in_my_district.geojson", conn, cur)
-    load_ksu_gates("data/ksu_gates.csv", conn, cur)
+    with span("etl.run"):
+        if args.restaurants:
+            load_restaurants(args.restaurants, conn, cur, args.label)
+        else:
+            load_districts("data/districts_sample_200.geojson", conn, cur)
+            load_restaurants("data/restaurants_sample_in_my_district.geojson", conn, cur, args.label)
+            load_ksu_gates("data/ksu_gates.csv", conn, cur)
 
 
     cur.close()
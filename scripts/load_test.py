@@ -0,0 +1,516 @@
+"""
+Load test: simulated concurrent dashboard users against the analysis layer.
+
+Each simulated user runs sessions the way app.py drives the data layer.
+Every action is one script rerun: load_all_data, then the sidebar queries,
+then the "restaurants in view" tile query. load_all_data is replayed as in
+the app: one value shared by all sessions and reloaded once per
+APP_CACHE_TTL_SECONDS (st.cache_resource), read from the spatial cache
+(spatial_cache.load_cached_frames, in a temp directory so the run starts
+cold), with the analysis pipeline on the query service only when that
+cache misses.
+
+- cold_start  : first rerun of a session (default filters)
+- campus      : pick another campus (gate list + filtered summary)
+- gate        : pick a gate of that campus (filtered summary)
+- tab         : interaction inside a tab, e.g. the view-margin slider
+                (same queries, new map bbox)
+
+with a random think time between actions. All users share one QueryService,
+as Streamlit sessions share one process.
+
+Backends:
+- postgres : the real loaders on the database from config/db.cfg. Peak
+             server connections are sampled from pg_stat_activity.
+- memory   : loaders answer from frames built from the data/ files and sleep
+             for a simulated query time (MEMORY_QUERY_MS * --latency-scale).
+             No database is needed; use it to compare service / cache
+             settings, not absolute database capacity.
+
+Reported: p50 / p95 / p99 latency per action and overall, throughput
+(actions/s), errors, peak connections borrowed from the pool and how often
+load_all_data ran.
+
+usage:
+    python scripts/load_test.py --users 50 --duration 60
+    python scripts/load_test.py --backend postgres --users 20 --ttl 0 --max-connections 8
+    python scripts/load_test.py --users 100 --json load.json --max-p95-ms 500
+"""
+
+import argparse
+import json
+import math
+import random
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+
+from riyadh_ksu_geo.analysis import (build_gate_summary,
+                                     get_nearest_restaurant_per_gate,
+                                     load_restaurants_in_tiles)
+from riyadh_ksu_geo.query_builder import ALL_OPTION
+from riyadh_ksu_geo.query_service import (QueryService,
+                                          QUERY_LOADERS,
+                                          DEFAULT_TTL_SECONDS,
+                                          POOL_MAX_CONNECTIONS)
+from riyadh_ksu_geo.spatial_cache import (PIPELINE_QUERIES,
+                                          build_cached_frames,
+                                          load_cached_frames)
+from riyadh_ksu_geo.tile_cache import BBoxTileCache
+
+
+DATA_DIR = "data"
+ACTIONS = ["cold_start", "campus", "gate", "tab"]
+# relative weights of the actions after the cold start
+ACTION_WEIGHTS = {"campus": 0.3, "gate": 0.4, "tab": 0.3}
+# st.cache_resource(ttl=60) on app.load_all_data
+APP_CACHE_TTL_SECONDS = 60
+
+DEFAULT_USERS = 20
+DEFAULT_DURATION_SECONDS = 30
+DEFAULT_THINK_TIME_SECONDS = 1.0
+DEFAULT_ACTIONS_PER_SESSION = 8
+
+# simulated database time per query for the memory backend (ms)
+MEMORY_QUERY_MS = {
+    "district_stats": 40,
+    "gates_with_district": 10,
+    "gate_restaurant_distances": 120,
+    "gate_restaurants_1km": 30,
+    "campus_options": 2,
+    "gate_name_options": 2,
+    "filtered_gate_summary": 15,
+    "restaurants_in_tiles": 10,
+}
+
+
+# -------------------------------------------------------------------
+# In-memory backend
+# -------------------------------------------------------------------
+class _MemoryConnection:
+    def rollback(self):
+        pass
+
+
+class _MemoryPool:
+    """Stands in for ThreadedConnectionPool; connections are free."""
+
+    def getconn(self):
+        return _MemoryConnection()
+
+    def putconn(self, conn):
+        pass
+
+    def closeall(self):
+        pass
+
+
+def build_memory_tables(data_dir=DATA_DIR):
+    """
+    The analysis tables computed in pandas from the data/ files (same
+    columns as the SQL loaders, district / distance logic as in the SQL).
+    """
+    districts = gpd.read_file(f"{data_dir}/districts_sample_200.geojson").to_crs("EPSG:32638")
+    districts = districts.rename(columns={
+        "NEIGHBORHENAME": "district_name_en", "NEIGHBORHANAME": "district_name_ar",
+    })
+    districts["district_id"] = np.arange(1, len(districts) + 1)
+    districts["area_km2"] = districts.geometry.area / 10 ** 6
+
+    restaurants = gpd.read_file(f"{data_dir}/restaurants_sample_in_my_district.geojson")
+    restaurants["lat"] = restaurants.geometry.y
+    restaurants["lon"] = restaurants.geometry.x
+    restaurants = restaurants.to_crs("EPSG:32638")
+    restaurants["restaurant_id"] = np.arange(1, len(restaurants) + 1)
+
+    gates_df = pd.read_csv(f"{data_dir}/ksu_gates.csv")
+    gates = gpd.GeoDataFrame(
+        gates_df,
+        geometry=gpd.points_from_xy(gates_df["longitude"], gates_df["latitude"]),
+        crs="EPSG:4326",
+    ).to_crs("EPSG:32638")
+    gates["lat"], gates["lon"] = gates_df["latitude"], gates_df["longitude"]
+
+    district_cols = ["district_id", "district_name_en", "district_name_ar", "geometry"]
+    in_district = gpd.sjoin(restaurants, districts[district_cols], predicate="within")
+    stats = in_district.groupby("district_id").agg(
+        restaurant_count=("restaurant_id", "count"), avg_rating=("rating", "mean")
+    ).reset_index()
+    district_stats = districts[district_cols + ["area_km2"]].merge(stats, on="district_id")
+    district_stats["restaurants_per_km2"] = (
+        district_stats["restaurant_count"] / district_stats["area_km2"]
+    )
+    district_stats = district_stats.rename_geometry("district_geom")
+
+    gates_with_district = gpd.sjoin(
+        gates, districts[district_cols], how="left", predicate="within"
+    ).drop(columns="index_right").rename_geometry("gate_geom")
+
+    dist_m = np.hypot(
+        gates.geometry.x.to_numpy()[:, None] - restaurants.geometry.x.to_numpy()[None, :],
+        gates.geometry.y.to_numpy()[:, None] - restaurants.geometry.y.to_numpy()[None, :],
+    )
+    gate_idx, restaurant_idx = np.indices(dist_m.shape).reshape(2, -1)
+    distances = pd.DataFrame({
+        "gate_id": gates["gate_id"].to_numpy()[gate_idx],
+        "gate_name_en": gates["gate_name_en"].to_numpy()[gate_idx],
+        "campus": gates["campus"].to_numpy()[gate_idx],
+        "restaurant_id": restaurants["restaurant_id"].to_numpy()[restaurant_idx],
+        "restaurant_name": restaurants["name"].to_numpy()[restaurant_idx],
+        "rating": restaurants["rating"].to_numpy()[restaurant_idx],
+        "categories": restaurants["categories"].to_numpy()[restaurant_idx],
+        "dist_km": dist_m.ravel() / 1000,
+    })
+
+    within = distances[distances["dist_km"] <= 1]
+    restaurants_1km = within.groupby(["gate_id", "gate_name_en", "campus"]).agg(
+        restaurants_1km=("restaurant_id", "count"), avg_rating_1km=("rating", "mean")
+    ).reset_index()
+
+    summary = build_gate_summary(
+        gates_with_district,
+        get_nearest_restaurant_per_gate(distances),
+        restaurants_1km,
+    )
+
+    return {
+        "district_stats": district_stats,
+        "gates_with_district": gates_with_district,
+        "gate_restaurant_distances": distances,
+        "gate_restaurants_1km": restaurants_1km,
+        "gate_summary": summary,
+        "restaurant_points": pd.DataFrame(restaurants[["restaurant_id", "name", "lat", "lon"]]),
+    }
+
+
+def memory_loaders(tables, latency_scale=1.0):
+    """Loader functions with the QUERY_LOADERS signatures, answering from `tables`."""
+
+    def simulated(name, result_fn):
+        def loader(conn, *params):
+            time.sleep(MEMORY_QUERY_MS[name] * latency_scale / 1000)
+            return result_fn(*params)
+        return loader
+
+    summary = tables["gate_summary"]
+
+    def gate_filter(campus, gate_name=ALL_OPTION):
+        mask = np.ones(len(summary), dtype=bool)
+        if campus != ALL_OPTION:
+            mask &= (summary["campus"] == campus).to_numpy()
+        if gate_name != ALL_OPTION:
+            mask &= (summary["gate_name_en"] == gate_name).to_numpy()
+        return summary[mask]
+
+    points = tables["restaurant_points"]
+
+    def in_tiles(tile_deg, tile_xs, tile_ys):
+        tile_x = np.floor(points["lon"] / tile_deg).astype(int)
+        tile_y = np.floor(points["lat"] / tile_deg).astype(int)
+        wanted = pd.DataFrame({"tile_x": tile_xs, "tile_y": tile_ys})
+        return (
+            points.assign(tile_x=tile_x, tile_y=tile_y)
+            .merge(wanted, on=["tile_x", "tile_y"])
+            .rename(columns={"name": "restaurant_name"})
+        )
+
+    loaders = {
+        name: simulated(name, lambda name=name: tables[name])
+        for name in PIPELINE_QUERIES
+    }
+    loaders.update({
+        "campus_options": simulated("campus_options", lambda: pd.DataFrame(
+            {"campus": sorted(summary["campus"].dropna().unique())}
+        )),
+        "gate_name_options": simulated("gate_name_options", lambda campus=ALL_OPTION: pd.DataFrame(
+            {"gate_name_en": sorted(gate_filter(campus)["gate_name_en"].dropna().unique())}
+        )),
+        "filtered_gate_summary": simulated("filtered_gate_summary", gate_filter),
+        "restaurants_in_tiles": simulated("restaurants_in_tiles", in_tiles),
+    })
+    return loaders
+
+
+# -------------------------------------------------------------------
+# Service with connection accounting
+# -------------------------------------------------------------------
+class LoadTestQueryService(QueryService):
+    """QueryService that tracks how many pooled connections are borrowed."""
+
+    def __init__(self, *args, memory=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.memory = memory
+        self._in_use = 0
+        self.peak_connections = 0
+        self._count_lock = threading.Lock()
+
+    def _get_pool(self):
+        if self.memory:
+            return _MemoryPool()
+        return super()._get_pool()
+
+    def run_with_connection(self, loader, *params):
+        def counted(conn, *params):
+            with self._count_lock:
+                self._in_use += 1
+                self.peak_connections = max(self.peak_connections, self._in_use)
+            try:
+                return loader(conn, *params)
+            finally:
+                with self._count_lock:
+                    self._in_use -= 1
+        return super().run_with_connection(counted, *params)
+
+
+class ServerConnectionSampler:
+    """Peak backend count of the database (pg_stat_activity), sampled."""
+
+    def __init__(self, interval=0.2):
+        from riyadh_ksu_geo.create_tables import get_connection
+        self.conn, self.cur = get_connection()
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.cur.execute(
+                "SELECT COUNT(*) FROM pg_stat_activity WHERE datname = current_database();"
+            )
+            self.peak = max(self.peak, self.cur.fetchone()[0])
+            self.conn.rollback()
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.cur.close()
+        self.conn.close()
+
+
+class AppResourceCache:
+    """
+    Stands in for st.cache_resource(ttl=...) on app.load_all_data: one value
+    shared by every session, loaded by the first caller once the ttl has
+    passed while the other callers wait. None results are cached too.
+    """
+
+    def __init__(self, load, ttl=APP_CACHE_TTL_SECONDS):
+        self.load = load
+        self.ttl = ttl
+        self.loads = 0
+        self._value = None
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._loaded_at is None or now - self._loaded_at >= self.ttl:
+                self._value = self.load()
+                self._loaded_at = time.monotonic()
+                self.loads += 1
+            return self._value
+
+
+def app_data_cache(service, cache_dir, ttl=APP_CACHE_TTL_SECONDS):
+    """app.load_all_data on `service`, with its spatial cache in `cache_dir`."""
+    def load_all_data():
+        return load_cached_frames(
+            lambda: build_cached_frames(service.get_many(PIPELINE_QUERIES)),
+            cache_dir=cache_dir,
+        )
+    return AppResourceCache(load_all_data, ttl)
+
+
+# -------------------------------------------------------------------
+# Sessions
+# -------------------------------------------------------------------
+def rerun(service, tile_cache, app_data, state):
+    """The data-layer calls of one app.py script run for this session state."""
+    if app_data.get() is None:
+        raise RuntimeError("load_all_data failed")
+
+    campus_options = service.get("campus_options")
+    gate_options = service.get("gate_name_options", (state["campus"],))
+    summary = service.get("filtered_gate_summary", (state["campus"], state["gate"]))
+    if campus_options is None or gate_options is None or summary is None:
+        raise RuntimeError("sidebar query failed")
+    state["campus_options"] = campus_options["campus"].tolist()
+    state["gate_options"] = gate_options["gate_name_en"].tolist()
+
+    if len(summary):
+        margin_lat = state["margin_km"] / 111.32
+        margin_lon = state["margin_km"] / (111.32 * math.cos(math.radians(
+            summary["lat"].mean()
+        )))
+        view = tile_cache.query(
+            summary["lon"].min() - margin_lon, summary["lat"].min() - margin_lat,
+            summary["lon"].max() + margin_lon, summary["lat"].max() + margin_lat,
+        )
+        if view is None:
+            raise RuntimeError("restaurants in view query failed")
+
+
+def next_action(state, rng):
+    action = rng.choices(list(ACTION_WEIGHTS), weights=list(ACTION_WEIGHTS.values()))[0]
+    if action == "campus":
+        state["campus"] = rng.choice([ALL_OPTION] + state["campus_options"])
+        state["gate"] = ALL_OPTION
+    elif action == "gate":
+        state["gate"] = rng.choice([ALL_OPTION] + state["gate_options"])
+    else:
+        state["margin_km"] = rng.choice([0.5, 1.0, 2.0, 5.0])
+    return action
+
+
+def run_user(user_id, service, tile_cache, app_data, args, deadline, results, seed):
+    rng = random.Random(seed + user_id)
+    while time.monotonic() < deadline:
+        state = {"campus": ALL_OPTION, "gate": ALL_OPTION,
+                 "margin_km": 1.0, "campus_options": [], "gate_options": []}
+        action = "cold_start"
+        for _ in range(args.actions_per_session):
+            start = time.perf_counter()
+            error = None
+            try:
+                rerun(service, tile_cache, app_data, state)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            results.append((action, time.perf_counter() - start, error))
+
+            time.sleep(rng.expovariate(1 / args.think_time) if args.think_time > 0 else 0)
+            if time.monotonic() >= deadline:
+                return
+            action = next_action(state, rng)
+
+
+def summarize(results, wall_seconds):
+    rows = []
+    frame = pd.DataFrame(results, columns=["action", "seconds", "error"])
+    frame["ok"] = frame["error"].isna()
+    for action, group in [("all", frame)] + [(a, frame[frame["action"] == a]) for a in ACTIONS]:
+        ms = group.loc[group["ok"], "seconds"].to_numpy() * 1000
+        rows.append({
+            "action": action,
+            "count": len(group),
+            "errors": int((~group["ok"]).sum()),
+            "p50_ms": float(np.percentile(ms, 50)) if len(ms) else None,
+            "p95_ms": float(np.percentile(ms, 95)) if len(ms) else None,
+            "p99_ms": float(np.percentile(ms, 99)) if len(ms) else None,
+        })
+    throughput = len(frame) / wall_seconds if wall_seconds > 0 else 0.0
+    errors = frame["error"].dropna().value_counts().to_dict()
+    return pd.DataFrame(rows), throughput, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--backend", choices=["memory", "postgres"], default="memory")
+    parser.add_argument("--users", type=int, default=DEFAULT_USERS,
+                        help="concurrent simulated users")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION_SECONDS,
+                        help="seconds to run")
+    parser.add_argument("--think-time", type=float, default=DEFAULT_THINK_TIME_SECONDS,
+                        help="mean seconds between actions (exponential)")
+    parser.add_argument("--actions-per-session", type=int, default=DEFAULT_ACTIONS_PER_SESSION)
+    parser.add_argument("--ttl", type=float, default=DEFAULT_TTL_SECONDS,
+                        help="query service ttl (0 = every rerun goes to the database)")
+    parser.add_argument("--max-connections", type=int, default=POOL_MAX_CONNECTIONS)
+    parser.add_argument("--app-cache-ttl", type=float, default=APP_CACHE_TTL_SECONDS,
+                        help="load_all_data cache ttl (st.cache_resource in the app)")
+    parser.add_argument("--latency-scale", type=float, default=1.0,
+                        help="memory backend: multiplier for MEMORY_QUERY_MS")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--max-p95-ms", type=float,
+                        help="exit 1 when the overall p95 is slower (regression check)")
+    args = parser.parse_args()
+
+    memory = args.backend == "memory"
+    if memory:
+        loaders = memory_loaders(build_memory_tables(), args.latency_scale)
+    else:
+        loaders = {**QUERY_LOADERS, "restaurants_in_tiles": load_restaurants_in_tiles}
+
+    service = LoadTestQueryService(
+        loaders,
+        ttl=args.ttl,
+        stale_ttl=args.ttl,
+        max_connections=args.max_connections,
+        memory=memory,
+    )
+    # as get_restaurant_tile_cache: tiles expire with the service ttl
+    tile_cache = BBoxTileCache(
+        lambda tile_deg, tile_xs, tile_ys: service.run_with_connection(
+            loaders["restaurants_in_tiles"], tile_deg, tile_xs, tile_ys
+        ),
+        max_age_seconds=args.ttl,
+    )
+    spatial_cache_dir = tempfile.mkdtemp(prefix="load_test_spatial_")
+    app_data = app_data_cache(service, spatial_cache_dir, args.app_cache_ttl)
+
+    sampler = None if memory else ServerConnectionSampler()
+    if sampler is not None:
+        sampler.start()
+
+    results = []
+    start = time.monotonic()
+    deadline = start + args.duration
+    try:
+        with ThreadPoolExecutor(max_workers=args.users) as pool:
+            for user_id in range(args.users):
+                pool.submit(run_user, user_id, service, tile_cache, app_data,
+                            args, deadline, results, args.seed)
+        wall_seconds = time.monotonic() - start
+    finally:
+        if sampler is not None:
+            sampler.stop()
+        service.close()
+        shutil.rmtree(spatial_cache_dir, ignore_errors=True)
+
+    report, throughput, errors = summarize(results, wall_seconds)
+    print(f"backend={args.backend} users={args.users} duration={wall_seconds:.1f}s "
+          f"ttl={args.ttl:g}s max_connections={args.max_connections}")
+    print(report.to_string(index=False, float_format=lambda v: f"{v:.1f}"))
+    print(f"throughput: {throughput:.1f} actions/s")
+    print(f"peak pool connections: {service.peak_connections}")
+    if sampler is not None:
+        print(f"peak server connections: {sampler.peak}")
+    print(f"load_all_data runs: {app_data.loads}")
+    print(f"tile cache: {tile_cache.stats()}")
+    for error, count in errors.items():
+        print(f"Error ({count}x): {error}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "args": vars(args),
+                "actions": report.to_dict(orient="records"),
+                "throughput_per_s": throughput,
+                "peak_pool_connections": service.peak_connections,
+                "peak_server_connections": sampler.peak if sampler else None,
+                "load_all_data_runs": app_data.loads,
+                "tile_cache": tile_cache.stats(),
+                "errors": errors,
+            }, f, indent=2)
+
+    overall_p95 = report.loc[report["action"] == "all", "p95_ms"].iloc[0]
+    overall_p95 = None if overall_p95 is None else round(overall_p95, 1)
+    if args.max_p95_ms is not None and (overall_p95 is None or overall_p95 > args.max_p95_ms):
+        print(f"Error: overall p95 ({overall_p95} ms) is over the {args.max_p95_ms:g} ms budget")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+## this file turns the app's sidebar state into parameterised SQL.
+
+from riyadh_ksu_geo.sql_analysis_queries import (gate_name_options_query,
+                                                 filtered_gate_summary_query)
+
+
+ALL_OPTION = "All"
+
+# sidebar filter name -> indexed column it is pushed down to.
+# only these columns can ever end up in a WHERE clause.
+GATE_FILTER_COLUMNS = {
+    "campus": "g.campus",
+    "gate_name_en": "g.gate_name_en",
+}
+
+
+def build_gate_filters(campus=ALL_OPTION, gate_name=ALL_OPTION):
+    """
+
+    Normalise the sidebar selections into a hashable filter tuple,
+    e.g. (("campus", "female"),). "All" / empty selections are dropped, so
+    equivalent sidebar states share the same cache key.
+    """
+    selections = (
+        ("campus", campus),
+        ("gate_name_en", gate_name),
+    )
+    return tuple(
+        (column, value)
+        for column, value in selections
+        if value not in (None, "", ALL_OPTION)
+    )
+
+
+def build_where_clause(filters):
+    """
+
+    Turn a filter tuple into an " AND col = %s ..." fragment and its params.
+    """
+    predicates = []
+    params = []
+    for column, value in filters:
+        if column not in GATE_FILTER_COLUMNS:
+            raise ValueError(f"unsupported gate filter: {column}")
+        predicates.append(f"AND {GATE_FILTER_COLUMNS[column]} = %s")
+        params.append(value)
+
+    return " ".join(predicates), tuple(params)
+
+
+def build_gate_name_options_query(campus=ALL_OPTION):
+    """
+
+    SQL + params for the gate selectbox options of the selected campus.
+    """
+    where, params = build_where_clause(build_gate_filters(campus=campus))
+    return gate_name_options_query.format(where=where), params
+
+
+def build_filtered_gate_summary_query(campus=ALL_OPTION, gate_name=ALL_OPTION):
+    """
+
+    SQL + params for the gate summary rows matching the sidebar filters.
+    """
+    where, params = build_where_clause(build_gate_filters(campus, gate_name))
+    return filtered_gate_summary_query.format(where=where), params
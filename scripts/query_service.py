@@ -0,0 +1,285 @@
+"""
+Shared asyncio query service for the Streamlit app.
+
+Every Streamlit session runs in the same Python process, so one service
+instance (see get_query_service) is shared by all of them. The service:
+
+- coalesces identical in-flight queries (single-flight): when N sessions ask
+  for the same query while it is running, they all await the same task and
+  the database executes it once.
+- bounds concurrency per query type with an asyncio.Semaphore.
+- serves stale results while revalidating: once a result is older than `ttl`
+  it is still returned immediately (up to `stale_ttl`) and a single
+  background refresh is started.
+
+The analysis loaders are blocking (psycopg2), so they run in worker threads
+via asyncio.to_thread, on connections borrowed from a shared pool. There are
+more query names than pooled connections, so a loader waits for a free
+connection instead of failing when the pool is exhausted.
+"""
+
+import asyncio
+import threading
+import time
+
+from psycopg2.pool import ThreadedConnectionPool
+
+from riyadh_ksu_geo.create_tables import get_connection_params
+from riyadh_ksu_geo.telemetry import CACHE_REQUESTS, POOL_IN_USE, POOL_WAIT_SECONDS
+from riyadh_ksu_geo.analysis import (
+    load_district_stats,
+    load_gates_with_district,
+    load_gate_restaurant_distances,
+    load_gate_restaurants_1km,
+    load_campus_options,
+    load_gate_name_options,
+    load_filtered_gate_summary,
+)
+
+
+DEFAULT_TTL_SECONDS = 600
+DEFAULT_STALE_TTL_SECONDS = 3600
+DEFAULT_MAX_CONCURRENCY = 1
+
+POOL_MIN_CONNECTIONS = 1
+POOL_MAX_CONNECTIONS = 4
+
+# query name -> loader(conn, *params) from analysis.py
+QUERY_LOADERS = {
+    "district_stats": load_district_stats,
+    "gates_with_district": load_gates_with_district,
+    "gate_restaurant_distances": load_gate_restaurant_distances,
+    "gate_restaurants_1km": load_gate_restaurants_1km,
+    "campus_options": load_campus_options,
+    "gate_name_options": load_gate_name_options,
+    "filtered_gate_summary": load_filtered_gate_summary,
+}
+
+
+class _CacheEntry:
+    """A cached query result and the monotonic time it was loaded at."""
+
+    __slots__ = ("value", "loaded_at")
+
+    def __init__(self, value, loaded_at):
+        self.value = value
+        self.loaded_at = loaded_at
+
+
+class QueryService:
+    """
+    Run named analysis queries once for all sessions.
+
+    Parameters
+    ----------
+    loaders : dict
+        Query name -> callable(conn, *params) returning a DataFrame (or None
+        on error, like the loaders in analysis.py). Results are cached per
+        (name, params) key, so parameterised queries such as the sidebar
+        filters get one cache entry per filter tuple.
+    ttl : float
+        Seconds a result is considered fresh.
+    stale_ttl : float
+        Seconds a result may still be served while it is being revalidated.
+    max_concurrency : int or dict
+        Max concurrent executions per query name. A dict maps query names to
+        limits; names missing from it use DEFAULT_MAX_CONCURRENCY.
+    max_connections : int
+        Size of the shared connection pool.
+    """
+
+    def __init__(
+        self,
+        loaders=None,
+        ttl=DEFAULT_TTL_SECONDS,
+        stale_ttl=DEFAULT_STALE_TTL_SECONDS,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+        max_connections=POOL_MAX_CONNECTIONS,
+    ):
+        self.loaders = dict(QUERY_LOADERS if loaders is None else loaders)
+        self.ttl = ttl
+        self.stale_ttl = max(stale_ttl, ttl)
+        self.max_concurrency = max_concurrency
+        self.max_connections = max_connections
+
+        # only touched from the event loop thread
+        self._entries = {}
+        self._inflight = {}
+        self._semaphores = {}
+
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # ThreadedConnectionPool raises when exhausted; callers wait here instead
+        self._pool_slots = threading.BoundedSemaphore(max_connections)
+
+        # caches kept outside the service (e.g. tile_cache), see invalidate
+        self._invalidate_callbacks = []
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever,
+            name="query-service",
+            daemon=True,
+        )
+        self._thread.start()
+
+    # ---------------------------------------------------------------
+    # Database side (runs in worker threads)
+    # ---------------------------------------------------------------
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadedConnectionPool(
+                    min(POOL_MIN_CONNECTIONS, self.max_connections),
+                    self.max_connections,
+                    **get_connection_params()
+                )
+            return self._pool
+
+    def run_with_connection(self, loader, *params):
+        """
+        Run a blocking loader(conn, *params) on a pooled connection, without
+        caching. For callers that keep their own cache (e.g. tile_cache).
+        """
+        pool = self._get_pool()
+        start = time.perf_counter()
+        self._pool_slots.acquire()
+        try:
+            conn = pool.getconn()
+            POOL_WAIT_SECONDS.observe(time.perf_counter() - start)
+            POOL_IN_USE.inc()
+            try:
+                return loader(conn, *params)
+            finally:
+                # loaders only read; end their transaction before handing back
+                conn.rollback()
+                pool.putconn(conn)
+                POOL_IN_USE.dec()
+        finally:
+            self._pool_slots.release()
+
+    def _run_loader(self, name, params):
+        return self.run_with_connection(self.loaders[name], *params)
+
+    # ---------------------------------------------------------------
+    # Event loop side
+    # ---------------------------------------------------------------
+    def _semaphore(self, name):
+        semaphore = self._semaphores.get(name)
+        if semaphore is None:
+            limit = self.max_concurrency
+            if isinstance(limit, dict):
+                limit = limit.get(name, DEFAULT_MAX_CONCURRENCY)
+            semaphore = asyncio.Semaphore(limit)
+            self._semaphores[name] = semaphore
+        return semaphore
+
+    async def _execute(self, key):
+        name, params = key
+        try:
+            async with self._semaphore(name):
+                value = await asyncio.to_thread(self._run_loader, name, params)
+        except Exception as e:
+            print(f"Error while running query {name}:", e)
+            return None
+
+        # loaders return None on error: keep serving the previous result
+        if value is not None:
+            self._entries[key] = _CacheEntry(value, time.monotonic())
+        return value
+
+    def _start(self, key):
+        """Return the in-flight task for `key`, starting one if needed."""
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._loop.create_task(self._execute(key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _task: self._inflight.pop(key, None))
+        return task
+
+    async def fetch(self, name, params=()):
+        """
+        Return the result of query `name` for `params`, following the
+        fresh / stale / expired rules described in the module docstring.
+        """
+        if name not in self.loaders:
+            raise KeyError(f"unknown query: {name}")
+
+        key = (name, tuple(params))
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry.loaded_at
+            if age < self.ttl:
+                CACHE_REQUESTS.inc(cache="query_service", result="hit")
+                return entry.value
+            if age < self.stale_ttl:
+                CACHE_REQUESTS.inc(cache="query_service", result="stale")
+                self._start(key)
+                return entry.value
+
+        CACHE_REQUESTS.inc(cache="query_service", result="miss")
+        # shield: one caller being cancelled must not cancel the shared task
+        value = await asyncio.shield(self._start(key))
+        if value is None and entry is not None:
+            return entry.value
+        return value
+
+    async def fetch_many(self, names):
+        return await asyncio.gather(*(self.fetch(name) for name in names))
+
+    # ---------------------------------------------------------------
+    # Blocking API for Streamlit script threads
+    # ---------------------------------------------------------------
+    def get(self, name, params=(), timeout=None):
+        future = asyncio.run_coroutine_threadsafe(
+            self.fetch(name, params), self._loop
+        )
+        return future.result(timeout)
+
+    def get_many(self, names, timeout=None):
+        future = asyncio.run_coroutine_threadsafe(
+            self.fetch_many(names), self._loop
+        )
+        return future.result(timeout)
+
+    def add_invalidate_callback(self, callback):
+        """Call callback(name) from invalidate(name), e.g. to clear a cache of its own."""
+        self._invalidate_callbacks.append(callback)
+
+    def invalidate(self, name=None):
+        """
+        Drop the cached results of one query (or of all queries), and tell
+        the registered invalidate callbacks.
+        """
+
+        def _drop():
+            if name is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if k[0] == name]:
+                    del self._entries[key]
+
+        self._loop.call_soon_threadsafe(_drop)
+        for callback in list(self._invalidate_callbacks):
+            callback(name)
+
+    def close(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_query_service():
+    """Return the process-wide QueryService, creating it on first use."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = QueryService()
+        return _service
@@ -0,0 +1,162 @@
+"""
+Prepared statements and server-side cursors for the analysis queries.
+
+- read_prepared: PREPAREs a query once per database session (the statement
+  name is derived from the SQL text) and EXECUTEs it, so repeated loads on a
+  pooled connection skip parsing / planning. The prepared names are tracked
+  per connection on the client, so a warm call is one round trip (EXECUTE),
+  plus a savepoint when the caller has a transaction open.
+  Returns a DataFrame, or a GeoDataFrame when `geom_col` is given.
+- stream_query: runs a query through a named (server-side) cursor and yields
+  DataFrame chunks of `fetch_size` rows, so the client never holds the full
+  result. PostgreSQL cannot DECLARE a cursor over EXECUTE, so streamed queries
+  are sent as plain SQL; the plan is still built once per cursor.
+"""
+
+import hashlib
+import re
+import threading
+import uuid
+import weakref
+
+import pandas as pd
+import geopandas as gpd
+import shapely
+from psycopg2.errors import InvalidSqlStatementName
+from psycopg2.extensions import TRANSACTION_STATUS_INTRANS
+
+
+DEFAULT_FETCH_SIZE = 10_000
+
+# connection -> names PREPAREd on its session (dropped with the connection)
+_prepared = weakref.WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+
+
+def _statement_name(sql):
+    return "stmt_" + hashlib.md5(sql.encode("utf-8")).hexdigest()[:16]
+
+
+_PLACEHOLDER = re.compile(r"%%|%s|%\(")
+
+
+def _to_positional(sql):
+    """
+
+    Turn psycopg2 %s placeholders into PREPARE's $1, $2, ... with the rules
+    psycopg2 applies to a query with parameters: every %s is a placeholder
+    (inside string literals too) and %% is a literal %. So a literal '%s'
+    is written '%%s'. Named %(name)s placeholders are not supported.
+    """
+    counter = iter(range(1, len(sql) + 1))
+
+    def replace(match):
+        token = match.group()
+        if token == "%%":
+            return "%"
+        if token == "%(":
+            raise ValueError("prepared statements take %s placeholders, not %(name)s")
+        return f"${next(counter)}"
+
+    return _PLACEHOLDER.sub(replace, sql)
+
+
+def _prepared_names(conn):
+    with _prepared_lock:
+        names = _prepared.get(conn)
+        if names is None:
+            names = _prepared[conn] = set()
+        return names
+
+
+def prepare(cur, sql):
+    """
+    PREPARE `sql` on this session unless this connection already did.
+    Returns its name.
+    """
+    name = _statement_name(sql)
+    names = _prepared_names(cur.connection)
+    if name not in names:
+        body = _to_positional(sql).strip().rstrip(";")
+        cur.execute(f"PREPARE {name} AS {body}")
+        names.add(name)
+    return name
+
+
+def _execute(cur, name, params):
+    if params:
+        placeholders = ", ".join(["%s"] * len(params))
+        cur.execute(f"EXECUTE {name} ({placeholders})", tuple(params))
+    else:
+        cur.execute(f"EXECUTE {name}")
+
+
+def _to_geodataframe(df, geom_col):
+    """Parse hex EWKB from a plain cursor, like geopandas.read_postgis does."""
+    geoms = shapely.from_wkb(df[geom_col].astype(object).where(df[geom_col].notna(), None))
+    srids = shapely.get_srid(geoms[~shapely.is_missing(geoms)])
+    crs = f"EPSG:{srids[0]}" if len(srids) and srids[0] > 0 else None
+    df[geom_col] = geoms
+    return gpd.GeoDataFrame(df, geometry=geom_col, crs=crs)
+
+
+def _frame(rows, description):
+    columns = [column.name for column in description]
+    # coerce_float: NUMERIC -> float, same as pd.read_sql
+    return pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+
+
+def read_prepared(conn, sql, params=(), geom_col=None):
+    """
+
+    Execute `sql` (psycopg2 %s placeholders, see _to_positional) as a
+    prepared statement and return the full result as a DataFrame /
+    GeoDataFrame.
+
+    When the session lost the statement (DISCARD ALL, DEALLOCATE, ...) it is
+    PREPAREd again. Inside an open transaction the EXECUTE runs under a
+    savepoint, so only the failed EXECUTE is rolled back, never the
+    caller's earlier work.
+    """
+    # a warm call outside a transaction stays one round trip
+    in_transaction = conn.get_transaction_status() == TRANSACTION_STATUS_INTRANS
+    with conn.cursor() as cur:
+        name = prepare(cur, sql)
+        if in_transaction:
+            cur.execute("SAVEPOINT read_prepared")
+        try:
+            _execute(cur, name, params)
+        except InvalidSqlStatementName:
+            if in_transaction:
+                cur.execute("ROLLBACK TO SAVEPOINT read_prepared")
+            else:
+                conn.rollback()
+            _prepared_names(conn).discard(name)
+            prepare(cur, sql)
+            _execute(cur, name, params)
+        df = _frame(cur.fetchall(), cur.description)
+        if in_transaction:
+            cur.execute("RELEASE SAVEPOINT read_prepared")
+
+    if geom_col is not None:
+        return _to_geodataframe(df, geom_col)
+    return df
+
+
+def stream_query(conn, sql, params=None, fetch_size=DEFAULT_FETCH_SIZE, geom_col=None):
+    """
+
+    Yield the result of `sql` as DataFrame chunks of at most `fetch_size`
+    rows, read through a server-side cursor. The cursor is closed when the
+    generator is exhausted or closed.
+    """
+    name = f"stream_{uuid.uuid4().hex}"
+    with conn.cursor(name=name) as cur:
+        cur.itersize = fetch_size
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(fetch_size)
+            if not rows:
+                break
+            df = _frame(rows, cur.description)
+            yield _to_geodataframe(df, geom_col) if geom_col is not None else df
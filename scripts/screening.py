@@ -0,0 +1,324 @@
+"""
+Batch "what-if" screening of candidate sites (new gates, food kiosks).
+
+Candidates are never written to the database. Districts, restaurants and the
+existing gates are loaded once into in-memory STRtrees (ScreeningIndex) and a
+whole batch of candidate points is evaluated in one vectorized pass:
+
+- containing district          : one `within` tree query
+- restaurants per radius       : one `dwithin` query at the largest radius,
+                                 counted per radius with np.bincount
+- k nearest restaurants        : query_nearest for k=1; for k>1 the same
+                                 pairs, with a widening search for the
+                                 candidates that have fewer than k of them.
+                                 `knn_radius_m` optionally caps the search
+                                 (candidates then get NaN past the cap)
+- nearest existing gate        : one query_nearest
+- accessibility score          : analysis.score_points
+
+Candidates need finite coordinates: screen() raises a ValueError naming
+the rows that do not have them. The CLI moves CSV rows with a missing or
+invalid lon / lat to quarantine/screening_candidates_rejected.csv (as the ETL
+validation does) and screens the rest.
+
+usage:
+    python scripts/screening.py --spacing 250 [--bounds MINX MINY MAXX MAXY]
+    python scripts/screening.py --candidates points.csv   # lon / lat columns
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+from riyadh_ksu_geo.create_tables import get_connection
+from riyadh_ksu_geo.analysis import (load_district_polygons,
+                                     load_gates_with_district,
+                                     load_restaurant_points,
+                                     score_points)
+from riyadh_ksu_geo.validation import write_quarantine
+
+
+SCREENING_CRS = "EPSG:32638"
+DEFAULT_RADII_M = (250, 500, 1000, 2000)
+DEFAULT_K_NEAREST = 3
+# first widening step of the k nearest search, doubled per round
+KNN_SEARCH_STEP_M = 250
+DEFAULT_OUTPUT = "screening_results.csv"
+
+
+def candidate_grid(bounds, spacing_m):
+    """
+    Regular grid of candidate points (cell centres) over
+    bounds = (minx, miny, maxx, maxy) in EPSG:32638. Returns (x, y) arrays.
+    """
+    minx, miny, maxx, maxy = bounds
+    xs = np.arange(minx + spacing_m / 2, maxx, spacing_m)
+    ys = np.arange(miny + spacing_m / 2, maxy, spacing_m)
+    grid_x, grid_y = np.meshgrid(xs, ys)
+    return grid_x.ravel(), grid_y.ravel()
+
+
+def candidates_from_lonlat(lon, lat):
+    """Project WGS84 lon / lat arrays to EPSG:32638 (x, y) arrays."""
+    points = gpd.GeoSeries(gpd.points_from_xy(lon, lat), crs="EPSG:4326")
+    points = points.to_crs(SCREENING_CRS)
+    return shapely.get_x(points.values), shapely.get_y(points.values)
+
+
+class ScreeningIndex:
+    """
+
+    In-memory spatial indexes over districts, restaurants and existing gates
+    (all EPSG:32638). Build once, then call screen() for any number of
+    candidate batches.
+    """
+
+    def __init__(self, districts_gdf, restaurants_df, gates_gdf):
+        self.districts = districts_gdf.reset_index(drop=True)
+        self.district_tree = shapely.STRtree(self.districts.geometry.values)
+
+        self.restaurants = restaurants_df.reset_index(drop=True)
+        self.restaurant_x = self.restaurants["x"].to_numpy(dtype=float)
+        self.restaurant_y = self.restaurants["y"].to_numpy(dtype=float)
+        self.restaurant_tree = shapely.STRtree(
+            shapely.points(self.restaurant_x, self.restaurant_y)
+        )
+
+        self.gates = gates_gdf.drop_duplicates(subset=["gate_id"]).reset_index(drop=True)
+        self.gate_tree = shapely.STRtree(self.gates.geometry.values)
+
+    @classmethod
+    def from_connection(cls, conn):
+        """Load the three layers with the analysis loaders (one query each)."""
+        return cls(
+            load_district_polygons(conn),
+            load_restaurant_points(conn),
+            load_gates_with_district(conn),
+        )
+
+    def _districts_for(self, points):
+        point_idx, district_idx = self.district_tree.query(points, predicate="within")
+        # districts should not overlap; keep the first match per candidate
+        first = np.full(len(points), -1, dtype=np.intp)
+        first[point_idx[::-1]] = district_idx[::-1]
+
+        found = first >= 0
+        district_id = pd.array([None] * len(points), dtype="Int64")
+        district_name = np.full(len(points), None, dtype=object)
+        district_id[found] = self.districts["district_id"].to_numpy()[first[found]]
+        district_name[found] = self.districts["district_name_en"].to_numpy()[first[found]]
+        return district_id, district_name
+
+    def _nearest_gates(self, points):
+        point_idx, gate_idx = self.gate_tree.query_nearest(points, all_matches=False)
+        dist = shapely.distance(points[point_idx], self.gates.geometry.values[gate_idx])
+
+        gate_id = pd.array([None] * len(points), dtype="Int64")
+        gate_name = np.full(len(points), None, dtype=object)
+        gate_dist = np.full(len(points), np.nan)
+        gate_id[point_idx] = self.gates["gate_id"].to_numpy()[gate_idx]
+        gate_name[point_idx] = self.gates["gate_name_en"].to_numpy()[gate_idx]
+        gate_dist[point_idx] = dist
+        return gate_id, gate_name, gate_dist
+
+    def _restaurant_pairs(self, x, y, points, search_m):
+        """(candidate, restaurant, distance) within search_m, sorted by candidate then distance."""
+        point_idx, restaurant_idx = self.restaurant_tree.query(
+            points, predicate="dwithin", distance=search_m
+        )
+        dist = np.hypot(x[point_idx] - self.restaurant_x[restaurant_idx],
+                        y[point_idx] - self.restaurant_y[restaurant_idx])
+        order = np.lexsort((dist, point_idx))
+        return point_idx[order], restaurant_idx[order], dist[order]
+
+    def _nearest_restaurant_pairs(self, x, y, points, k, pairs, search_m, knn_radius_m):
+        """
+
+        (candidate, restaurant, distance) pairs holding at least the k nearest
+        restaurants of every candidate, sorted by candidate then distance.
+        `pairs` are the pairs within search_m from _restaurant_pairs.
+        Without `knn_radius_m` the search is doubled for the candidates with
+        fewer than k pairs until they have k; with it, only restaurants within
+        knn_radius_m count.
+        """
+        if knn_radius_m is not None:
+            point_idx, restaurant_idx, dist = pairs
+            keep = dist <= knn_radius_m
+            return point_idx[keep], restaurant_idx[keep], dist[keep]
+
+        if k == 1:
+            point_idx, restaurant_idx = self.restaurant_tree.query_nearest(
+                points, all_matches=False
+            )
+            dist = np.hypot(x[point_idx] - self.restaurant_x[restaurant_idx],
+                            y[point_idx] - self.restaurant_y[restaurant_idx])
+            order = np.argsort(point_idx, kind="stable")
+            return point_idx[order], restaurant_idx[order], dist[order]
+
+        point_idx, restaurant_idx, dist = pairs
+        want = min(k, len(self.restaurants))
+        pending = np.flatnonzero(np.bincount(point_idx, minlength=len(points)) < want)
+        if len(pending) == 0:
+            return pairs
+
+        # search rings around the nearest restaurant's distance (the k-th is
+        # at least that far), widened until every candidate has k restaurants
+        (nearest_of, _), nearest_dist = self.restaurant_tree.query_nearest(
+            points[pending], all_matches=False, return_distance=True
+        )
+        base = np.full(len(pending), float(search_m))
+        base[nearest_of] = np.maximum(nearest_dist, search_m)
+        margin = np.full(len(pending), float(KNN_SEARCH_STEP_M))
+
+        keep = ~np.isin(point_idx, pending)
+        found = [(point_idx[keep], restaurant_idx[keep], dist[keep])]
+        while len(pending):
+            sub_idx, sub_restaurant_idx, sub_dist = self._restaurant_pairs(
+                x[pending], y[pending], points[pending], base + margin
+            )
+            done = np.bincount(sub_idx, minlength=len(pending)) >= want
+            keep = done[sub_idx]
+            found.append((pending[sub_idx[keep]], sub_restaurant_idx[keep], sub_dist[keep]))
+            pending, base, margin = pending[~done], base[~done], margin[~done] * 2
+
+        point_idx, restaurant_idx, dist = (np.concatenate(part) for part in zip(*found))
+        order = np.lexsort((dist, point_idx))
+        return point_idx[order], restaurant_idx[order], dist[order]
+
+    def screen(
+        self,
+        x,
+        y,
+        radii_m=DEFAULT_RADII_M,
+        k_nearest=DEFAULT_K_NEAREST,
+        knn_radius_m=None,
+        score=True
+    ):
+        """
+
+        Evaluate candidates at x / y (EPSG:32638 metres). Returns one row per
+        candidate (same order) with the containing district, restaurant counts
+        per radius, the k nearest restaurants, the nearest existing gate and
+        (when `score`) the accessibility score with the default settings.
+
+        The nearest restaurants are searched without a distance limit unless
+        `knn_radius_m` is given. Raises ValueError when a candidate has a
+        missing or non-finite coordinate.
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        bad = np.flatnonzero(~(np.isfinite(x) & np.isfinite(y)))
+        if len(bad):
+            shown = ", ".join(str(i) for i in bad[:10]) + (", ..." if len(bad) > 10 else "")
+            raise ValueError(
+                f"{len(bad)} candidates have missing or non-finite coordinates "
+                f"(rows {shown})"
+            )
+        n = len(x)
+        points = shapely.points(x, y)
+        radii_m = sorted(radii_m)
+        search_m = max(radii_m[-1], knn_radius_m or 0)
+
+        result = {"candidate_id": np.arange(n), "x": x, "y": y}
+        result["district_id"], result["district_name_en"] = self._districts_for(points)
+
+        pairs = self._restaurant_pairs(x, y, points, search_m)
+        point_idx, _, dist = pairs
+        for radius in radii_m:
+            within = dist <= radius
+            result[f"restaurants_{radius:g}m"] = np.bincount(point_idx[within], minlength=n)
+
+        point_idx, restaurant_idx, dist = self._nearest_restaurant_pairs(
+            x, y, points, k_nearest, pairs, search_m, knn_radius_m
+        )
+
+        # rank of each pair within its candidate (pairs are sorted by distance)
+        starts = np.searchsorted(point_idx, np.arange(n))
+        rank = np.arange(len(point_idx)) - starts[point_idx]
+        ids = self.restaurants["restaurant_id"].to_numpy()
+        names = self.restaurants["restaurant_name"].to_numpy(dtype=object)
+        for k in range(1, k_nearest + 1):
+            pick = rank == k - 1
+            nearest_id = pd.array([None] * n, dtype="Int64")
+            nearest_name = np.full(n, None, dtype=object)
+            nearest_dist = np.full(n, np.nan)
+            nearest_id[point_idx[pick]] = ids[restaurant_idx[pick]]
+            nearest_name[point_idx[pick]] = names[restaurant_idx[pick]]
+            nearest_dist[point_idx[pick]] = dist[pick]
+            result[f"nearest_{k}_restaurant_id"] = nearest_id
+            result[f"nearest_{k}_restaurant_name"] = nearest_name
+            result[f"nearest_{k}_dist_m"] = nearest_dist
+
+        (result["nearest_gate_id"],
+         result["nearest_gate_name_en"],
+         result["nearest_gate_dist_m"]) = self._nearest_gates(points)
+
+        screened = pd.DataFrame(result)
+        if score:
+            scores = score_points(x, y, self.restaurants)
+            screened["accessibility_score"] = scores["accessibility_score"].to_numpy()
+        return screened
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--spacing", type=float,
+                        help="screen a regular grid with this spacing (m)")
+    source.add_argument("--candidates",
+                        help="CSV with lon / lat columns of candidate points")
+    parser.add_argument("--bounds", type=float, nargs=4,
+                        metavar=("MINX", "MINY", "MAXX", "MAXY"),
+                        help="grid extent in EPSG:32638 (default: district extent)")
+    parser.add_argument("--radius", type=float, action="append",
+                        help="count radius in m (repeatable)")
+    parser.add_argument("-k", type=int, default=DEFAULT_K_NEAREST,
+                        help="nearest restaurants to report")
+    parser.add_argument("--knn-radius", type=float,
+                        help="only look for the nearest restaurants within this distance (m)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    conn, cur = get_connection()
+    try:
+        index = ScreeningIndex.from_connection(conn)
+    finally:
+        cur.close()
+        conn.close()
+
+    candidate_ids = None
+    if args.candidates:
+        candidates_df = pd.read_csv(args.candidates)
+        x, y = candidates_from_lonlat(
+            pd.to_numeric(candidates_df["lon"], errors="coerce"),
+            pd.to_numeric(candidates_df["lat"], errors="coerce"),
+        )
+        valid = np.isfinite(x) & np.isfinite(y)
+        rejected = candidates_df[~valid]
+        write_quarantine(
+            gpd.GeoDataFrame(rejected, geometry=[None] * len(rejected)),
+            "screening_candidates",
+        )
+        # candidate_id stays the CSV row number
+        x, y, candidate_ids = x[valid], y[valid], np.flatnonzero(valid)
+    else:
+        bounds = args.bounds or index.districts.total_bounds
+        x, y = candidate_grid(bounds, args.spacing)
+
+    screened = index.screen(
+        x, y,
+        radii_m=args.radius or DEFAULT_RADII_M,
+        k_nearest=args.k,
+        knn_radius_m=args.knn_radius,
+    )
+    if candidate_ids is not None:
+        screened["candidate_id"] = candidate_ids
+    screened.to_csv(args.output, index=False)
+    print(f"screened {len(screened)} candidates, results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""
+Export / import the full database state as one GeoPackage bundle.
+
+A bundle holds one layer per table plus two attribute layers:
+
+- snapshot_info   : format version, creation time, source database and the
+                    index statements to run after the load.
+- snapshot_tables : per table, its CREATE TABLE statement, column types,
+                    geometry column / SRID, row count and an md5 checksum.
+
+Values are stored as PostgreSQL's own text output (NUMERIC 'NaN' and NULL stay
+distinct). Geometries are stored as GeoPackage geometries. Generated columns
+(geom_4326) are not exported; they are rebuilt by the restore. The restore
+recreates the tables, bulk loads each one with COPY, builds the indexes, and
+commits only if every table checksum matches the bundle.
+
+usage:
+    python scripts/snapshot.py export [--output PATH] [--extra-table NAME ...]
+    python scripts/snapshot.py import PATH
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+import pandas as pd
+import geopandas as gpd
+import pyogrio
+import shapely
+import psycopg2
+from psycopg2 import sql
+
+from riyadh_ksu_geo.create_tables import get_connection
+from riyadh_ksu_geo.sql_queries import (create_postgis_extension,
+                                        create_index_queries,
+                                        create_table_statements,
+                                        create_restaurants_partition)
+
+
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_DIR = "snapshots"
+BASE_TABLES = ["districts", "restaurants", "ksu_gates",
+               "restaurant_snapshots", "restaurant_metric_deltas"]
+
+INFO_LAYER = "snapshot_info"
+TABLES_LAYER = "snapshot_tables"
+NULL_MARKER = r"\N"
+
+# the text form of timestamptz / date / float values depends on the session
+# settings: export and import both pin them, so the COPY text and the
+# checksums do not depend on the server or role defaults
+pin_text_output_settings = """
+SET LOCAL TIME ZONE 'UTC';
+SET LOCAL DateStyle = 'ISO, YMD';
+SET LOCAL IntervalStyle = 'postgres';
+SET LOCAL extra_float_digits = 1;
+"""
+
+
+table_columns_query = """
+SELECT
+    a.attname AS column_name,
+    format_type(a.atttypid, a.atttypmod) AS data_type,
+    a.attnotnull AS not_null
+FROM pg_attribute a
+WHERE a.attrelid = %s::regclass
+    AND a.attnum > 0
+    AND NOT a.attisdropped
+    AND a.attgenerated = ''
+ORDER BY a.attnum;
+"""
+
+geometry_columns_query = """
+SELECT f_geometry_column, srid
+FROM geometry_columns
+WHERE f_table_schema = current_schema() AND f_table_name = %s;
+"""
+
+
+def _table_columns(cur, table):
+    """Non-generated columns of `table` as [(name, type, not_null), ...]."""
+    cur.execute(table_columns_query, (table,))
+    return [tuple(row) for row in cur.fetchall()]
+
+
+def _layer_geometry(cur, table, column_names):
+    """The (column, srid) stored as the layer geometry, or (None, None)."""
+    cur.execute(geometry_columns_query, (table,))
+    for column, srid in cur.fetchall():
+        if column in column_names:
+            return column, srid
+    return None, None
+
+
+def _create_table_ddl(table, columns):
+    """CREATE TABLE for tables without a statement in sql_queries.py."""
+    if table in create_table_statements:
+        return create_table_statements[table]
+
+    column_defs = ",\n".join(
+        f"    {name} {data_type}{' NOT NULL' if not_null else ''}"
+        for name, data_type, not_null in columns
+    )
+    return f"CREATE TABLE IF NOT EXISTS {table} (\n{column_defs}\n);"
+
+
+def table_checksum(cur, table, column_names):
+    """
+
+    md5 over the sorted text form of every row (exported columns only),
+    computed in the database so export and restore are compared exactly.
+    Run it after pin_text_output_settings, in the same transaction.
+    Returns (checksum, row_count).
+    """
+    query = sql.SQL(
+        "SELECT md5(COALESCE(string_agg(t::text, E'\\n' ORDER BY t::text), '')), "
+        "COUNT(*) FROM (SELECT {columns} FROM {table}) t"
+    ).format(
+        columns=sql.SQL(", ").join(map(sql.Identifier, column_names)),
+        table=sql.Identifier(table),
+    )
+    cur.execute(query)
+    checksum, row_count = cur.fetchone()
+    return checksum, row_count
+
+
+def _copy_out(cur, table, column_names):
+    """Read a table with COPY TO, keeping every value as PostgreSQL text."""
+    query = sql.SQL(
+        "COPY (SELECT {columns} FROM {table}) TO STDOUT "
+        "WITH (FORMAT csv, HEADER, NULL {null})"
+    ).format(
+        columns=sql.SQL(", ").join(map(sql.Identifier, column_names)),
+        table=sql.Identifier(table),
+        null=sql.Literal(NULL_MARKER),
+    )
+    buffer = io.StringIO()
+    cur.copy_expert(query, buffer)
+    buffer.seek(0)
+    return pd.read_csv(
+        buffer,
+        dtype=str,
+        keep_default_na=False,
+        na_values=[NULL_MARKER],
+    )
+
+
+def _copy_in(cur, table, df):
+    """Bulk load `df` (all text, None for NULL) with COPY FROM."""
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False, na_rep=NULL_MARKER)
+    buffer.seek(0)
+
+    query = sql.SQL(
+        "COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv, NULL {null})"
+    ).format(
+        table=sql.Identifier(table),
+        columns=sql.SQL(", ").join(map(sql.Identifier, df.columns)),
+        null=sql.Literal(NULL_MARKER),
+    )
+    cur.copy_expert(query, buffer)
+
+
+def _reset_sequences(cur, table, column_names):
+    """Move identity / serial sequences past the restored keys."""
+    for column in column_names:
+        cur.execute("SELECT pg_get_serial_sequence(%s, %s);", (table, column))
+        sequence = cur.fetchone()[0]
+        if sequence is None:
+            continue
+        cur.execute(
+            sql.SQL(
+                "SELECT setval(%s, COALESCE(MAX({column}), 1), "
+                "MAX({column}) IS NOT NULL) FROM {table};"
+            ).format(column=sql.Identifier(column), table=sql.Identifier(table)),
+            (sequence,),
+        )
+
+
+def default_snapshot_path():
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    return os.path.join(SNAPSHOT_DIR, f"riyadh_ksu_geo_{stamp}.gpkg")
+
+
+def export_snapshot(conn, path, extra_tables=()):
+    """
+
+    Dump the base tables (and any `extra_tables`, e.g. derived summary tables)
+    into a single GeoPackage at `path`. Every table is read in one
+    REPEATABLE READ transaction, so the bundle is a consistent snapshot.
+    Returns the per-table manifest as a DataFrame.
+    """
+    tables = BASE_TABLES + [t for t in extra_tables if t not in BASE_TABLES]
+
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        os.remove(path)
+
+    conn.rollback()
+    cur = conn.cursor()
+    manifest_rows = []
+    try:
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY;")
+        cur.execute(pin_text_output_settings)
+        cur.execute("SELECT current_database();")
+        source_db = cur.fetchone()[0]
+
+        for table in tables:
+            columns = _table_columns(cur, table)
+            column_names = [name for name, _, _ in columns]
+            geom_col, srid = _layer_geometry(cur, table, column_names)
+            checksum, row_count = table_checksum(cur, table, column_names)
+            df = _copy_out(cur, table, column_names)
+
+            if geom_col is None:
+                pyogrio.write_dataframe(df, path, layer=table, driver="GPKG")
+            else:
+                geometry = df.pop(geom_col).astype(object)
+                geometry = shapely.from_wkb(geometry.where(geometry.notna(), None))
+                gdf = gpd.GeoDataFrame(df, geometry=geometry, crs=f"EPSG:{srid}")
+                gdf.to_file(path, layer=table, driver="GPKG")
+
+            manifest_rows.append({
+                "table_name": table,
+                "ddl": _create_table_ddl(table, columns),
+                "columns": json.dumps([[n, t] for n, t, _ in columns]),
+                "geometry_column": geom_col,
+                "srid": srid,
+                "row_count": row_count,
+                "checksum": checksum,
+            })
+            print(f"exported {table}: {row_count} rows")
+    finally:
+        conn.rollback()
+        cur.close()
+
+    info = pd.DataFrame([{
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "source_database": source_db,
+        "post_load_sql": "\n".join(create_index_queries),
+    }])
+    manifest = pd.DataFrame(manifest_rows)
+    pyogrio.write_dataframe(info, path, layer=INFO_LAYER, driver="GPKG")
+    pyogrio.write_dataframe(manifest, path, layer=TABLES_LAYER, driver="GPKG")
+
+    print(f"snapshot written to {path}")
+    return manifest
+
+
+def _read_layer(path, row):
+    """Read one table layer back as an all-text frame in column order."""
+    column_names = [name for name, _ in json.loads(row.columns)]
+
+    if pd.isna(row.geometry_column):
+        df = pyogrio.read_dataframe(path, layer=row.table_name, read_geometry=False)
+    else:
+        gdf = gpd.read_file(path, layer=row.table_name)
+        geometry = shapely.set_srid(gdf.geometry.values.to_numpy(), int(row.srid))
+        df = pd.DataFrame(gdf.drop(columns=gdf.geometry.name))
+        df[row.geometry_column] = shapely.to_wkb(geometry, hex=True, include_srid=True)
+
+    return df[column_names].astype(object).where(df[column_names].notna(), None)
+
+
+def import_snapshot(conn, path):
+    """
+
+    Restore a bundle written by export_snapshot. Existing tables with the
+    same names are dropped. Everything runs in one transaction that is only
+    committed when all checksums match. Returns True on success.
+    """
+    info = pyogrio.read_dataframe(path, layer=INFO_LAYER).iloc[0]
+    if int(info.format_version) > SNAPSHOT_FORMAT_VERSION:
+        print(f"Error: snapshot format {info.format_version} is newer than "
+              f"supported version {SNAPSHOT_FORMAT_VERSION}")
+        return False
+    manifest = pyogrio.read_dataframe(path, layer=TABLES_LAYER)
+
+    cur = conn.cursor()
+    try:
+        cur.execute(pin_text_output_settings)
+        cur.execute(create_postgis_extension)
+        for table in reversed(manifest["table_name"].tolist()):
+            cur.execute(sql.SQL("DROP TABLE IF EXISTS {};").format(sql.Identifier(table)))
+        for row in manifest.itertuples(index=False):
+            cur.execute(row.ddl)
+
+        for row in manifest.itertuples(index=False):
+            df = _read_layer(path, row)
+            if row.table_name == "restaurants":
+                # same per-municipality partitions as the ETL (-1 -> default)
+                for code in sorted({int(c) for c in df["municipality_code"]}):
+                    if code >= 0:
+                        cur.execute(create_restaurants_partition.format(code=code))
+            _copy_in(cur, row.table_name, df)
+            _reset_sequences(cur, row.table_name, df.columns)
+            print(f"restored {row.table_name}: {len(df)} rows")
+
+        # indexes are cheaper to build once, after the bulk load
+        cur.execute(info.post_load_sql)
+
+        mismatches = []
+        for row in manifest.itertuples(index=False):
+            column_names = [name for name, _ in json.loads(row.columns)]
+            checksum, row_count = table_checksum(cur, row.table_name, column_names)
+            if checksum != row.checksum or row_count != int(row.row_count):
+                mismatches.append(row.table_name)
+
+        if mismatches:
+            conn.rollback()
+            print("Error: checksum mismatch, restore rolled back for:", mismatches)
+            return False
+
+        conn.commit()
+
+    except psycopg2.Error as e:
+        conn.rollback()
+        print("Error while restoring snapshot:", e)
+        return False
+
+    finally:
+        cur.close()
+
+    print(f"snapshot {path} restored and verified")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="dump tables to a bundle")
+    export_parser.add_argument("--output", default=None,
+                               help="bundle path (default: snapshots/<timestamp>.gpkg)")
+    export_parser.add_argument("--extra-table", action="append", default=[],
+                               help="additional (derived) table to include")
+
+    import_parser = subparsers.add_parser("import", help="restore a bundle")
+    import_parser.add_argument("path")
+
+    args = parser.parse_args()
+
+    conn, cur = get_connection()
+    try:
+        if args.command == "export":
+            export_snapshot(conn, args.output or default_snapshot_path(),
+                            args.extra_table)
+            ok = True
+        else:
+            ok = import_snapshot(conn, args.path)
+    finally:
+        cur.close()
+        conn.close()
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,443 @@
+"""
+Memory-mapped binary cache of the analysis outputs for fast app cold start.
+
+Each cached frame is a version directory <name>.<version>/ of raw NumPy
+files plus a meta.json, and <name>.current names the live version:
+
+- numeric / bool / datetime columns : <col>.npy
+- nullable Int / Float / boolean    : <col>.npy (NA as 0 / False) and
+                                      <col>.valid.npy (null mask)
+- string columns                    : <col>.utf8 (concatenated UTF-8 bytes),
+                                      <col>.offsets.npy (n + 1 int64) and
+                                      <col>.valid.npy (null mask)
+- geometry column                   : shapely ragged arrays
+                                      (<col>.coords.npy, <col>.offsets<i>.npy,
+                                      <col>.valid.npy) + geometry type / CRS
+
+Files are opened with np.load(mmap_mode="r"), so every Streamlit worker
+process maps the same OS page-cache pages instead of unpickling its own copy.
+A write builds a new version directory and then replaces the pointer file
+(os.replace), so readers always find a complete frame, and concurrent writers
+never write into the same directory.
+Geometries are only rebuilt (shapely.from_ragged_array) the first time a view
+asks for them.
+
+usage (pre-build the cache, e.g. from cron after the ETL):
+    python scripts/spatial_cache.py
+"""
+
+import json
+import os
+import shutil
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+from riyadh_ksu_geo.create_tables import get_connection
+from riyadh_ksu_geo.analysis import (load_district_stats,
+                                     load_gates_with_district,
+                                     load_gate_restaurant_distances,
+                                     load_gate_restaurants_1km,
+                                     get_nearest_restaurant_per_gate,
+                                     build_gate_summary)
+from riyadh_ksu_geo.telemetry import CACHE_REQUESTS
+
+
+CACHE_DIR = os.path.join("cache", "spatial")
+CACHE_FORMAT_VERSION = 2
+CACHE_MAX_AGE_SECONDS = 3600
+META_FILE = "meta.json"
+POINTER_SUFFIX = ".current"
+# replaced versions are removed once they are this old (readers that opened
+# them just before the swap still find their files)
+OLD_VERSION_GRACE_SECONDS = 300
+
+# the analysis queries behind the cached frames (in build_cached_frames
+# order), and the cached frames (in load_cached_frames order)
+PIPELINE_QUERIES = [
+    "district_stats",
+    "gates_with_district",
+    "gate_restaurant_distances",
+    "gate_restaurants_1km",
+]
+CACHED_FRAMES = [
+    "districts_stats",
+    "gates_with_district",
+    "gate_restaurant_distances",
+    "gate_restaurants_1km",
+    "nearest",
+    "gate_summary",
+]
+
+# nullable extension arrays stored as values + null mask
+_MASKED_ARRAYS = (pd.arrays.IntegerArray, pd.arrays.FloatingArray,
+                  pd.arrays.BooleanArray)
+
+# single-part type -> multi-part type, used to make mixed columns uniform
+_MULTI_TYPES = {
+    shapely.GeometryType.POINT: shapely.MultiPoint,
+    shapely.GeometryType.LINESTRING: shapely.MultiLineString,
+    shapely.GeometryType.POLYGON: shapely.MultiPolygon,
+}
+
+
+# -------------------------------------------------------------------
+# Writing
+# -------------------------------------------------------------------
+def _write_strings(directory, column, series):
+    valid = series.notna().to_numpy()
+    encoded = [
+        str(value).encode("utf-8") if ok else b""
+        for value, ok in zip(series.to_numpy(dtype=object), valid)
+    ]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+
+    with open(os.path.join(directory, f"{column}.utf8"), "wb") as f:
+        f.write(b"".join(encoded))
+    np.save(os.path.join(directory, f"{column}.offsets.npy"), offsets)
+    np.save(os.path.join(directory, f"{column}.valid.npy"), valid)
+
+
+def _write_geometry(directory, column, series):
+    geoms = np.asarray(series.values, dtype=object)
+    valid = ~shapely.is_missing(geoms)
+
+    # ragged arrays need one geometry type: promote singles if parts are mixed
+    type_ids = set(shapely.get_type_id(geoms[valid]).tolist())
+    if len(type_ids) > 1:
+        geoms = np.array([
+            _MULTI_TYPES[shapely.get_type_id(g)]([g])
+            if g is not None and shapely.get_type_id(g) in _MULTI_TYPES else g
+            for g in geoms
+        ], dtype=object)
+
+    geometry_type, coords, offsets = shapely.to_ragged_array(geoms)
+    np.save(os.path.join(directory, f"{column}.coords.npy"), coords)
+    for i, offset in enumerate(offsets):
+        np.save(os.path.join(directory, f"{column}.offsets{i}.npy"), offset)
+    np.save(os.path.join(directory, f"{column}.valid.npy"), valid)
+
+    crs = series.crs.to_string() if getattr(series, "crs", None) else None
+    return {"geometry_type": int(geometry_type),
+            "offset_count": len(offsets),
+            "crs": crs}
+
+
+def _write_masked(directory, column, series):
+    values = series.array
+    np.save(os.path.join(directory, f"{column}.npy"),
+            values.to_numpy(dtype=values.dtype.numpy_dtype,
+                            na_value=values.dtype.numpy_dtype.type(0)))
+    np.save(os.path.join(directory, f"{column}.valid.npy"),
+            ~values.isna())
+    return {"dtype": str(series.dtype)}
+
+
+def _as_numeric(series):
+    """Numeric view of an object column (e.g. NUMERIC -> Decimal), or None."""
+    if not pd.api.types.is_object_dtype(series.dtype):
+        return None
+    values = series.dropna()
+    if len(values) == 0 or values.map(lambda v: isinstance(v, str)).any():
+        return None
+    try:
+        return pd.to_numeric(series).astype("float64")
+    except (TypeError, ValueError):
+        return None
+
+
+def _pointer_path(cache_dir, name):
+    return os.path.join(cache_dir, name + POINTER_SUFFIX)
+
+
+def _current_version(cache_dir, name):
+    """Directory name of the live version of `name`, or None."""
+    try:
+        with open(_pointer_path(cache_dir, name), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _remove_old_versions(cache_dir, name):
+    """Remove replaced versions of `name` older than the grace period."""
+    current = _current_version(cache_dir, name)
+    cutoff = time.time() - OLD_VERSION_GRACE_SECONDS
+    for entry in os.scandir(cache_dir):
+        if (entry.name.startswith(f"{name}.v") and entry.name != current
+                and entry.is_dir() and entry.stat().st_mtime < cutoff):
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+def write_frame(df, name, cache_dir=CACHE_DIR):
+    """
+
+    Write a (Geo)DataFrame as a new version directory <cache_dir>/<name>.v*/
+    and point <name>.current at it with os.replace, so readers never see a
+    half-written frame and concurrent writers never share a directory (the
+    last swap wins).
+    """
+    version = f"{name}.v{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+    staging = os.path.join(cache_dir, version)
+    os.makedirs(staging)
+
+    columns = []
+    for column in df.columns:
+        series = df[column]
+        entry = {"name": column}
+
+        if isinstance(series.dtype, gpd.array.GeometryDtype):
+            entry["kind"] = "geometry"
+            entry.update(_write_geometry(staging, column, series))
+        elif pd.api.types.is_datetime64_any_dtype(series.dtype):
+            entry["kind"] = "datetime"
+            entry["dtype"] = str(series.dtype)
+            np.save(os.path.join(staging, f"{column}.npy"),
+                    series.to_numpy().view("int64"))
+        elif isinstance(series.array, _MASKED_ARRAYS):
+            entry["kind"] = "masked"
+            entry.update(_write_masked(staging, column, series))
+        elif pd.api.types.is_numeric_dtype(series.dtype) and not isinstance(
+            series.dtype, pd.api.extensions.ExtensionDtype
+        ):
+            entry["kind"] = "numeric"
+            np.save(os.path.join(staging, f"{column}.npy"), series.to_numpy())
+        elif (numeric := _as_numeric(series)) is not None:
+            entry["kind"] = "numeric"
+            np.save(os.path.join(staging, f"{column}.npy"), numeric.to_numpy())
+        else:
+            entry["kind"] = "string"
+            _write_strings(staging, column, series)
+
+        columns.append(entry)
+
+    geometry_name = df.geometry.name if isinstance(df, gpd.GeoDataFrame) else None
+    meta = {
+        "format_version": CACHE_FORMAT_VERSION,
+        "created_at": time.time(),
+        "row_count": len(df),
+        "geometry": geometry_name,
+        "columns": columns,
+    }
+    with open(os.path.join(staging, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+    pointer = _pointer_path(cache_dir, name)
+    pointer_tmp = f"{pointer}.tmp-{uuid.uuid4().hex[:8]}"
+    with open(pointer_tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(pointer_tmp, pointer)
+    _remove_old_versions(cache_dir, name)
+
+
+# -------------------------------------------------------------------
+# Reading
+# -------------------------------------------------------------------
+class MappedFrame:
+    """
+
+    Read-only view of a cached frame. Columns are memory-mapped on first
+    access; strings are decoded and geometries rebuilt only when asked for.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta["format_version"] != CACHE_FORMAT_VERSION:
+            raise ValueError(f"unsupported spatial cache format in {path}")
+
+        self._columns = {c["name"]: c for c in self.meta["columns"]}
+        self._loaded = {}
+
+    def __len__(self):
+        return self.meta["row_count"]
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    @property
+    def geometry_name(self):
+        return self.meta["geometry"]
+
+    @property
+    def created_at(self):
+        return self.meta["created_at"]
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _map(self, name):
+        return np.load(self._file(name), mmap_mode="r")
+
+    def column(self, name):
+        if name in self._loaded:
+            return self._loaded[name]
+
+        entry = self._columns[name]
+        if entry["kind"] == "numeric":
+            values = self._map(f"{name}.npy")
+        elif entry["kind"] == "datetime":
+            values = self._map(f"{name}.npy").view(entry["dtype"])
+        elif entry["kind"] == "masked":
+            array_type = pd.api.types.pandas_dtype(entry["dtype"]).construct_array_type()
+            values = array_type(self._map(f"{name}.npy"),
+                                ~self._map(f"{name}.valid.npy"))
+        elif entry["kind"] == "string":
+            values = self._decode_strings(name)
+        else:
+            values = self._build_geometry(name, entry)
+
+        self._loaded[name] = values
+        return values
+
+    def _decode_strings(self, name):
+        offsets = self._map(f"{name}.offsets.npy")
+        valid = self._map(f"{name}.valid.npy")
+        data = np.memmap(self._file(f"{name}.utf8"), dtype=np.uint8, mode="r") \
+            if offsets[-1] > 0 else np.empty(0, dtype=np.uint8)
+        raw = data.tobytes()
+        return np.array([
+            raw[offsets[i]:offsets[i + 1]].decode("utf-8") if valid[i] else None
+            for i in range(len(valid))
+        ], dtype=object)
+
+    def _build_geometry(self, name, entry):
+        coords = self._map(f"{name}.coords.npy")
+        offsets = tuple(
+            self._map(f"{name}.offsets{i}.npy")
+            for i in range(entry["offset_count"])
+        )
+        geoms = shapely.from_ragged_array(
+            shapely.GeometryType(entry["geometry_type"]), coords, offsets or None
+        )
+        valid = self._map(f"{name}.valid.npy")
+        geoms[~valid] = None
+        return gpd.GeoSeries(geoms, crs=entry["crs"], name=name)
+
+    def to_pandas(self, columns=None):
+        """Attribute columns as a DataFrame; numeric columns stay mapped."""
+        columns = [
+            c for c in (columns or self.columns)
+            if self._columns[c]["kind"] != "geometry"
+        ]
+        return pd.DataFrame({c: self.column(c) for c in columns}, copy=False)
+
+    def to_geopandas(self, columns=None):
+        """Attribute columns plus the (lazily rebuilt) geometry column."""
+        df = self.to_pandas(columns)
+        if self.geometry_name is None:
+            return df
+        df[self.geometry_name] = self.column(self.geometry_name).values
+        return gpd.GeoDataFrame(
+            df, geometry=self.geometry_name,
+            crs=self._columns[self.geometry_name]["crs"],
+        )
+
+
+def open_frame(name, cache_dir=CACHE_DIR, max_age=CACHE_MAX_AGE_SECONDS):
+    """
+
+    Open a cached frame, or return None when it is missing, unreadable or
+    older than `max_age` seconds (None disables the age check).
+    """
+    version = _current_version(cache_dir, name)
+    try:
+        if version is None:
+            raise FileNotFoundError(_pointer_path(cache_dir, name))
+        frame = MappedFrame(os.path.join(cache_dir, version))
+    except (FileNotFoundError, ValueError, KeyError, json.JSONDecodeError):
+        CACHE_REQUESTS.inc(cache="spatial", result="miss")
+        return None
+
+    if max_age is not None and time.time() - frame.created_at > max_age:
+        CACHE_REQUESTS.inc(cache="spatial", result="stale")
+        return None
+    CACHE_REQUESTS.inc(cache="spatial", result="hit")
+    return frame
+
+
+def write_frames(frames, cache_dir=CACHE_DIR):
+    """Write a {name: frame} dict."""
+    for name, df in frames.items():
+        write_frame(df, name, cache_dir)
+
+
+def build_cached_frames(query_frames):
+    """
+
+    The CACHED_FRAMES ({name: frame}) from the results of the
+    PIPELINE_QUERIES, given in that order. Returns None when one of the
+    queries failed (None).
+    """
+    if any(df is None for df in query_frames):
+        return None
+    (districts_stats_gdf,
+     gates_with_district_gdf,
+     gate_restaurant_distances_df,
+     gate_restaurants_1km_df) = query_frames
+
+    nearest_df = get_nearest_restaurant_per_gate(gate_restaurant_distances_df)
+    gate_summary_df = build_gate_summary(
+        gates_with_district_gdf, nearest_df, gate_restaurants_1km_df
+    )
+
+    return dict(zip(CACHED_FRAMES, (
+        districts_stats_gdf,
+        gates_with_district_gdf,
+        gate_restaurant_distances_df,
+        gate_restaurants_1km_df,
+        nearest_df,
+        gate_summary_df,
+    )))
+
+
+def load_cached_frames(build, cache_dir=CACHE_DIR, max_age=CACHE_MAX_AGE_SECONDS):
+    """
+
+    The CACHED_FRAMES as a tuple of DataFrames (numeric columns stay mapped,
+    geometry columns are left out). When one is missing or stale, build()
+    -> {name: frame} runs and the cache is rewritten first. Returns None
+    when build() returns None.
+    """
+    frames = [open_frame(name, cache_dir, max_age) for name in CACHED_FRAMES]
+    if any(frame is None for frame in frames):
+        fresh = build()
+        if fresh is None:
+            return None
+        write_frames(fresh, cache_dir)
+        frames = [open_frame(name, cache_dir, max_age=None) for name in CACHED_FRAMES]
+        if any(frame is None for frame in frames):
+            return None
+
+    return tuple(frame.to_pandas() for frame in frames)
+
+
+def main():
+    loaders = [load_district_stats,
+               load_gates_with_district,
+               load_gate_restaurant_distances,
+               load_gate_restaurants_1km]
+    conn, cur = get_connection()
+    try:
+        frames = build_cached_frames([load(conn) for load in loaders])
+    finally:
+        cur.close()
+        conn.close()
+
+    if frames is None:
+        print("Error: a query failed, spatial cache not written")
+        return
+
+    write_frames(frames)
+    print(f"spatial cache written to {CACHE_DIR}")
+
+
+if __name__ == "__main__":
+    main()
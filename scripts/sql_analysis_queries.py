@@ -1,21 +1,30 @@
 ## this file will continas all needed analysis queries.
 
 
+## restaurants carry (municipality_code, district_id) from the ETL, so this is
+## an equi-join on the partition key (partition pruning) instead of ST_Contains.
+## Every current-state query only keeps restaurants of the latest snapshot
+## (last_snapshot_id = newest restaurant_snapshots row); older rows are
+## restaurants that have closed since.
 district_stats_query = """
 SELECT 
-    district_id,
+    districts.district_id,
     district_name_en,
     district_name_ar,
     area_km2,
     COUNT(restaurant_id) AS restaurant_count,
     AVG(rating) AS avg_rating,
     (COUNT(restaurant_id) / area_km2) AS restaurants_per_km2,
-    districts.geom AS district_geom
+    districts.geom AS district_geom,
+    ST_Y(ST_PointOnSurface(districts.geom_4326)) AS lat,
+    ST_X(ST_PointOnSurface(districts.geom_4326)) AS lon
 FROM 
 districts INNER JOIN restaurants 
 ON 
-ST_Contains(districts.geom, restaurants.geom)
-GROUP BY 1,2,3,4,8;
+restaurants.municipality_code = COALESCE(districts.municipality_code, -1)
+AND restaurants.district_id = districts.district_id
+AND restaurants.last_snapshot_id = (SELECT max(snapshot_id) FROM restaurant_snapshots)
+GROUP BY 1,2,3,4,8,9,10;
 """
 
 
@@ -28,6 +37,8 @@ SELECT
     gate_type,
     access_notes,
     ksu_gates.geom as gate_geom,
+    ST_Y(ksu_gates.geom_4326) AS lat,
+    ST_X(ksu_gates.geom_4326) AS lon,
     district_id,
     district_name_en,
     district_name_ar
@@ -48,7 +59,8 @@ SELECT
     rating,
     categories,
     ST_Distance(ksu_gates.geom ,restaurants.geom) / 1000 AS dist_km
-FROM ksu_gates , restaurants;
+FROM ksu_gates , restaurants
+WHERE restaurants.last_snapshot_id = (SELECT max(snapshot_id) FROM restaurant_snapshots);
 """
 
 gate_restaurants_1km_query = """
@@ -61,5 +73,275 @@ SELECT
 FROM 
 ksu_gates INNER JOIN restaurants
 ON ST_DWithin(ksu_gates.geom, restaurants.geom, 1000)
+AND restaurants.last_snapshot_id = (SELECT max(snapshot_id) FROM restaurant_snapshots)
 GROUP BY 1,2,3;
-"""
\ No newline at end of file
+"""
+
+## sidebar-driven queries used by the app (see query_builder.py).
+## `{where}` is filled with whitelisted predicates, values are bound as %s params.
+
+campus_options_query = """
+SELECT DISTINCT campus
+FROM ksu_gates
+WHERE campus IS NOT NULL
+ORDER BY campus;
+"""
+
+gate_name_options_query = """
+SELECT DISTINCT gate_name_en
+FROM ksu_gates g
+WHERE gate_name_en IS NOT NULL {where}
+ORDER BY gate_name_en;
+"""
+
+filtered_gate_summary_query = """
+SELECT 
+    g.gate_id,
+    g.gate_name_en,
+    g.gate_name_ar,
+    g.campus,
+    g.gate_type,
+    g.access_notes,
+    district.district_id,
+    district.district_name_en,
+    district.district_name_ar,
+    nearest.restaurant_id,
+    nearest.restaurant_name,
+    nearest.rating,
+    nearest.categories,
+    nearest.dist_km,
+    within_1km.restaurants_1km,
+    within_1km.avg_rating_1km,
+    ST_Y(g.geom_4326) AS lat,
+    ST_X(g.geom_4326) AS lon
+FROM 
+ksu_gates g
+LEFT JOIN LATERAL (
+    SELECT district_id, district_name_en, district_name_ar
+    FROM districts
+    WHERE ST_Contains(districts.geom, g.geom)
+    LIMIT 1
+) district ON TRUE
+LEFT JOIN LATERAL (
+    SELECT 
+        restaurant_id,
+        name AS restaurant_name,
+        rating,
+        categories,
+        ST_Distance(g.geom, restaurants.geom) / 1000 AS dist_km
+    FROM restaurants
+    WHERE restaurants.last_snapshot_id = (SELECT max(snapshot_id) FROM restaurant_snapshots)
+    ORDER BY g.geom <-> restaurants.geom
+    LIMIT 1
+) nearest ON TRUE
+LEFT JOIN LATERAL (
+    SELECT 
+        COUNT(restaurant_id) AS restaurants_1km,
+        AVG(rating) AS avg_rating_1km
+    FROM restaurants
+    WHERE ST_DWithin(g.geom, restaurants.geom, 1000)
+    AND restaurants.last_snapshot_id = (SELECT max(snapshot_id) FROM restaurant_snapshots)
+) within_1km ON TRUE
+WHERE TRUE {where}
+ORDER BY within_1km.restaurants_1km DESC, nearest.dist_km;
+"""
+
+## every district polygon (also those without restaurants), for in-memory
+## point-in-district lookups such as candidate screening
+district_polygons_query = """
+SELECT 
+    district_id,
+    district_name_en,
+    district_name_ar,
+    geom AS district_geom
+FROM districts
+WHERE geom IS NOT NULL;
+"""
+
+
+## restaurant points + attractiveness attributes for the accessibility score
+## (scored client-side against gates / candidate points, see analysis.py)
+restaurant_points_query = """
+SELECT 
+    restaurant_id,
+    name AS restaurant_name,
+    rating,
+    likes,
+    rating_signals,
+    price_code,
+    ST_X(geom) AS x,
+    ST_Y(geom) AS y
+FROM restaurants
+WHERE geom IS NOT NULL
+AND last_snapshot_id = (SELECT max(snapshot_id) FROM restaurant_snapshots);
+"""
+
+
+## restaurants of a set of map tiles (tile_cache.py). Tiles are cells of a
+## regular lon / lat grid with side `tile_deg`; `&&` on the tile envelope uses
+## the geom_4326 GiST index, the floor() test assigns points on a tile edge
+## to exactly one tile.
+restaurants_in_tiles_query = """
+WITH grid AS (
+    SELECT %s::float8 AS tile_deg
+),
+tiles AS (
+    SELECT t.tile_x, t.tile_y, grid.tile_deg
+    FROM unnest(%s::int[], %s::int[]) AS t(tile_x, tile_y), grid
+)
+SELECT 
+    tiles.tile_x,
+    tiles.tile_y,
+    r.restaurant_id,
+    r.name AS restaurant_name,
+    r.categories,
+    r.rating,
+    ST_Y(r.geom_4326) AS lat,
+    ST_X(r.geom_4326) AS lon
+FROM tiles
+JOIN restaurants r
+ON r.geom_4326 && ST_MakeEnvelope(
+        tiles.tile_x * tiles.tile_deg,
+        tiles.tile_y * tiles.tile_deg,
+        (tiles.tile_x + 1) * tiles.tile_deg,
+        (tiles.tile_y + 1) * tiles.tile_deg,
+        4326)
+AND floor(ST_X(r.geom_4326) / tiles.tile_deg) = tiles.tile_x
+AND floor(ST_Y(r.geom_4326) / tiles.tile_deg) = tiles.tile_y
+AND r.last_snapshot_id = (SELECT max(snapshot_id) FROM restaurant_snapshots);
+"""
+
+
+restaurant_snapshots_query = """
+SELECT snapshot_id, label, source_file, loaded_at, restaurant_count
+FROM restaurant_snapshots
+ORDER BY snapshot_id;
+"""
+
+
+## snapshot diffs: the state of a restaurant at snapshot S is its
+## restaurant_metric_deltas row with the largest snapshot_id <= S (one
+## backward primary-key lookup per side); it exists at S when that row is
+## present (a restaurant can close and come back). Neither snapshot is
+## reloaded.
+## params: snapshot_a, snapshot_b (+ radius in metres for gates).
+gate_snapshot_diff_query = """
+WITH params AS (
+    SELECT %s::int AS snapshot_a, %s::int AS snapshot_b, %s::float8 AS radius_m
+),
+pairs AS (
+    SELECT 
+        g.gate_id,
+        g.gate_name_en,
+        g.campus,
+        COALESCE(a.present, FALSE) AS in_a,
+        COALESCE(b.present, FALSE) AS in_b,
+        a.rating AS rating_a, b.rating AS rating_b,
+        a.likes AS likes_a, b.likes AS likes_b,
+        a.tips AS tips_a, b.tips AS tips_b
+    FROM ksu_gates g
+    CROSS JOIN params p
+    LEFT JOIN restaurants r
+    ON ST_DWithin(g.geom, r.geom, p.radius_m)
+    AND r.snapshot_id <= GREATEST(p.snapshot_a, p.snapshot_b)
+    AND r.last_snapshot_id >= LEAST(p.snapshot_a, p.snapshot_b)
+    LEFT JOIN LATERAL (
+        SELECT present, rating, likes, tips
+        FROM restaurant_metric_deltas d
+        WHERE d.municipality_code = r.municipality_code
+            AND d.restaurant_id = r.restaurant_id
+            AND d.snapshot_id <= p.snapshot_a
+        ORDER BY d.snapshot_id DESC
+        LIMIT 1
+    ) a ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT present, rating, likes, tips
+        FROM restaurant_metric_deltas d
+        WHERE d.municipality_code = r.municipality_code
+            AND d.restaurant_id = r.restaurant_id
+            AND d.snapshot_id <= p.snapshot_b
+        ORDER BY d.snapshot_id DESC
+        LIMIT 1
+    ) b ON TRUE
+)
+SELECT 
+    gate_id,
+    gate_name_en,
+    campus,
+    COUNT(*) FILTER (WHERE in_a) AS restaurants_a,
+    COUNT(*) FILTER (WHERE in_b) AS restaurants_b,
+    COUNT(*) FILTER (WHERE in_b) - COUNT(*) FILTER (WHERE in_a) AS restaurants_change,
+    COUNT(*) FILTER (WHERE in_b AND NOT in_a) AS opened,
+    COUNT(*) FILTER (WHERE in_a AND NOT in_b) AS closed,
+    AVG(rating_a) FILTER (WHERE in_a) AS avg_rating_a,
+    AVG(rating_b) FILTER (WHERE in_b) AS avg_rating_b,
+    AVG(rating_b) FILTER (WHERE in_b) - AVG(rating_a) FILTER (WHERE in_a) AS avg_rating_change,
+    SUM(likes_b - likes_a) FILTER (WHERE in_a AND in_b) AS likes_change,
+    SUM(tips_b - tips_a) FILTER (WHERE in_a AND in_b) AS tips_change
+FROM pairs
+GROUP BY gate_id, gate_name_en, campus
+ORDER BY gate_id;
+"""
+
+
+## same per district, on the (municipality_code, district_id) equi-join
+## used by district_stats_query
+district_snapshot_diff_query = """
+WITH params AS (
+    SELECT %s::int AS snapshot_a, %s::int AS snapshot_b
+),
+pairs AS (
+    SELECT 
+        districts.district_id,
+        districts.district_name_en,
+        districts.area_km2,
+        COALESCE(a.present, FALSE) AS in_a,
+        COALESCE(b.present, FALSE) AS in_b,
+        a.rating AS rating_a, b.rating AS rating_b,
+        a.likes AS likes_a, b.likes AS likes_b,
+        a.tips AS tips_a, b.tips AS tips_b
+    FROM districts
+    CROSS JOIN params p
+    JOIN restaurants r
+    ON r.municipality_code = COALESCE(districts.municipality_code, -1)
+    AND r.district_id = districts.district_id
+    AND r.snapshot_id <= GREATEST(p.snapshot_a, p.snapshot_b)
+    AND r.last_snapshot_id >= LEAST(p.snapshot_a, p.snapshot_b)
+    LEFT JOIN LATERAL (
+        SELECT present, rating, likes, tips
+        FROM restaurant_metric_deltas d
+        WHERE d.municipality_code = r.municipality_code
+            AND d.restaurant_id = r.restaurant_id
+            AND d.snapshot_id <= p.snapshot_a
+        ORDER BY d.snapshot_id DESC
+        LIMIT 1
+    ) a ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT present, rating, likes, tips
+        FROM restaurant_metric_deltas d
+        WHERE d.municipality_code = r.municipality_code
+            AND d.restaurant_id = r.restaurant_id
+            AND d.snapshot_id <= p.snapshot_b
+        ORDER BY d.snapshot_id DESC
+        LIMIT 1
+    ) b ON TRUE
+)
+SELECT 
+    district_id,
+    district_name_en,
+    COUNT(*) FILTER (WHERE in_a) AS restaurants_a,
+    COUNT(*) FILTER (WHERE in_b) AS restaurants_b,
+    COUNT(*) FILTER (WHERE in_b) - COUNT(*) FILTER (WHERE in_a) AS restaurants_change,
+    (COUNT(*) FILTER (WHERE in_b) - COUNT(*) FILTER (WHERE in_a)) / area_km2
+        AS restaurants_per_km2_change,
+    COUNT(*) FILTER (WHERE in_b AND NOT in_a) AS opened,
+    COUNT(*) FILTER (WHERE in_a AND NOT in_b) AS closed,
+    AVG(rating_a) FILTER (WHERE in_a) AS avg_rating_a,
+    AVG(rating_b) FILTER (WHERE in_b) AS avg_rating_b,
+    AVG(rating_b) FILTER (WHERE in_b) - AVG(rating_a) FILTER (WHERE in_a) AS avg_rating_change,
+    SUM(likes_b - likes_a) FILTER (WHERE in_a AND in_b) AS likes_change,
+    SUM(tips_b - tips_a) FILTER (WHERE in_a AND in_b) AS tips_change
+FROM pairs
+GROUP BY district_id, district_name_en, area_km2
+ORDER BY district_id;
+"""
@@ -1,4 +1,7 @@
 # this file contins all needed queries.
+# every table keeps its geometry twice: `geom` in EPSG:32638 (metres, used for
+# areas / distances) and `geom_4326` (WGS84, used for display). geom_4326 is a
+# stored generated column, so it is filled at insert time by the ETL loads.
 
 
 create_postgis_extension = "CREATE EXTENSION IF NOT EXISTS postgis;"
@@ -6,6 +9,8 @@ create_postgis_extension = "CREATE EXTENSION IF NOT EXISTS postgis;"
 drop_districts_table = "DROP TABLE IF EXISTS districts;"
 drop_restaurants_table = "DROP TABLE IF EXISTS restaurants;"
 drop_ksu_gates_table = "DROP TABLE IF EXISTS ksu_gates;"
+drop_restaurant_snapshots_table = "DROP TABLE IF EXISTS restaurant_snapshots;"
+drop_restaurant_metric_deltas_table = "DROP TABLE IF EXISTS restaurant_metric_deltas;"
 
 create_districts_table = """
 CREATE TABLE IF NOT EXISTS districts (
@@ -20,7 +25,9 @@ CREATE TABLE IF NOT EXISTS districts (
     source_objectid INT,
     area_m2 NUMERIC,
     area_km2 NUMERIC,
-    geom geometry(MultiPolygon, 32638)
+    geom geometry(MultiPolygon, 32638),
+    geom_4326 geometry(MultiPolygon, 4326)
+        GENERATED ALWAYS AS (ST_Transform(geom, 4326)) STORED
 );
 """
 
@@ -45,9 +52,26 @@ VALUES (
 );
 """
 
+## restaurants is list-partitioned by municipality_code (one partition per
+## municipality, created by the ETL, see create_restaurants_partition).
+## restaurants outside every loaded district get municipality_code -1 and
+## land in the default partition. district_id / municipality_code are
+## assigned at load time so district queries are equi-joins, not ST_Contains.
+## every ETL run is a snapshot (restaurant_snapshots). A restaurant keeps one
+## row (and one geometry) across snapshots, matched on source_key (name +
+## coordinates rounded to 1 m); the row holds its latest values, snapshot_id
+## is the snapshot it first appeared in and last_snapshot_id the latest one.
+## Current-state queries keep the rows of the latest snapshot
+## (last_snapshot_id = max snapshot); presence in older snapshots is recorded
+## in restaurant_metric_deltas, since a restaurant can close and come back.
 create_restaurants_table = """
 CREATE TABLE IF NOT EXISTS restaurants (
-    restaurant_id INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    restaurant_id SERIAL,
+    district_id INT,
+    municipality_code INT NOT NULL,
+    source_key TEXT NOT NULL,
+    snapshot_id INT NOT NULL,
+    last_snapshot_id INT NOT NULL,
     name TEXT,
     categories TEXT,
     address TEXT,
@@ -59,13 +83,93 @@ CREATE TABLE IF NOT EXISTS restaurants (
     rating_signals NUMERIC,
     price_code NUMERIC,
     post_code TEXT,
-    geom geometry(Point,32638)
+    geom geometry(Point,32638),
+    geom_4326 geometry(Point, 4326)
+        GENERATED ALWAYS AS (ST_Transform(geom, 4326)) STORED,
+    PRIMARY KEY (municipality_code, restaurant_id),
+    UNIQUE (municipality_code, source_key)
+) PARTITION BY LIST (municipality_code);
+
+CREATE TABLE IF NOT EXISTS restaurants_default PARTITION OF restaurants DEFAULT;
+"""
+
+create_restaurants_partition = """
+CREATE TABLE IF NOT EXISTS restaurants_m{code}
+PARTITION OF restaurants FOR VALUES IN ({code});
+"""
+
+select_districts_for_assignment = """
+SELECT district_id, municipality_code, geom
+FROM districts;
+"""
+
+
+create_restaurant_snapshots_table = """
+CREATE TABLE IF NOT EXISTS restaurant_snapshots (
+    snapshot_id INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    label TEXT,
+    source_file TEXT,
+    loaded_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    restaurant_count INT
+);
+"""
+
+## metric / presence history as compact deltas: one row per restaurant per
+## snapshot in which it appeared, reappeared, disappeared (present = false,
+## no metrics) or one of its metrics changed, holding its state from that
+## snapshot on. No geometry / text.
+## The state of a restaurant at snapshot S is its row with the largest
+## snapshot_id <= S (primary key lookup); it exists at S when that row is
+## present.
+create_restaurant_metric_deltas_table = """
+CREATE TABLE IF NOT EXISTS restaurant_metric_deltas (
+    municipality_code INT NOT NULL,
+    restaurant_id INT NOT NULL,
+    snapshot_id INT NOT NULL,
+    present BOOLEAN NOT NULL DEFAULT TRUE,
+    likes NUMERIC,
+    photos NUMERIC,
+    tips NUMERIC,
+    rating NUMERIC,
+    rating_signals NUMERIC,
+    price_code NUMERIC,
+    PRIMARY KEY (municipality_code, restaurant_id, snapshot_id)
 );
 """
 
+insert_into_restaurant_snapshots_table = """
+INSERT INTO restaurant_snapshots (label, source_file)
+VALUES (%s, %s)
+RETURNING snapshot_id;
+"""
+
+## each restaurants load goes through a staging table and is merged into
+## restaurants / restaurant_metric_deltas with the set-based statements below
+create_restaurants_staging_table = """
+CREATE TEMP TABLE restaurants_staging (
+    district_id INT,
+    municipality_code INT NOT NULL,
+    source_key TEXT NOT NULL,
+    name TEXT,
+    categories TEXT,
+    address TEXT,
+    price TEXT,
+    likes NUMERIC, 
+    photos NUMERIC,
+    tips NUMERIC,
+    rating NUMERIC,
+    rating_signals NUMERIC,
+    price_code NUMERIC,
+    post_code TEXT,
+    geom geometry(Point,32638)
+) ON COMMIT DROP;
+"""
 
-insert_into_restaurants_table = """
-INSERT INTO restaurants (
+insert_into_restaurants_staging_table = """
+INSERT INTO restaurants_staging (
+    district_id,
+    municipality_code,
+    source_key,
     name,
     categories,
     address,
@@ -82,11 +186,123 @@ INSERT INTO restaurants (
 VALUES (
     %s, %s, %s, %s, %s,
     %s, %s, %s, %s, %s,
-    %s,
+    %s, %s, %s, %s,
     ST_GeomFromText(%s, 32638)
 );
 """
 
+## 1. restaurants of the previous snapshot missing from this one -> one
+##    "disappeared" delta row each
+insert_closed_restaurant_deltas = """
+INSERT INTO restaurant_metric_deltas (
+    municipality_code, restaurant_id, snapshot_id, present
+)
+SELECT r.municipality_code, r.restaurant_id, %(snapshot_id)s, FALSE
+FROM restaurants r
+WHERE r.last_snapshot_id = (
+    SELECT max(snapshot_id) FROM restaurant_snapshots
+    WHERE snapshot_id < %(snapshot_id)s
+)
+AND NOT EXISTS (
+    SELECT 1 FROM restaurants_staging s
+    WHERE s.municipality_code = r.municipality_code
+        AND s.source_key = r.source_key
+);
+"""
+
+## 2. known restaurants whose metrics changed, or that are back after missing
+##    from the previous snapshot -> one delta row each
+insert_changed_restaurant_metric_deltas = """
+INSERT INTO restaurant_metric_deltas (
+    municipality_code, restaurant_id, snapshot_id,
+    likes, photos, tips, rating, rating_signals, price_code
+)
+SELECT 
+    r.municipality_code, r.restaurant_id, %(snapshot_id)s,
+    s.likes, s.photos, s.tips, s.rating, s.rating_signals, s.price_code
+FROM restaurants_staging s
+JOIN restaurants r
+ON r.municipality_code = s.municipality_code AND r.source_key = s.source_key
+WHERE (r.likes, r.photos, r.tips, r.rating, r.rating_signals, r.price_code)
+    IS DISTINCT FROM
+    (s.likes, s.photos, s.tips, s.rating, s.rating_signals, s.price_code)
+OR r.last_snapshot_id IS DISTINCT FROM (
+    SELECT max(snapshot_id) FROM restaurant_snapshots
+    WHERE snapshot_id < %(snapshot_id)s
+);
+"""
+
+## 3. known restaurants take the latest values (geometry is not rewritten)
+update_restaurants_from_staging = """
+UPDATE restaurants r
+SET 
+    district_id = s.district_id,
+    categories = s.categories,
+    address = s.address,
+    price = s.price,
+    likes = s.likes,
+    photos = s.photos,
+    tips = s.tips,
+    rating = s.rating,
+    rating_signals = s.rating_signals,
+    price_code = s.price_code,
+    post_code = s.post_code,
+    last_snapshot_id = %(snapshot_id)s
+FROM restaurants_staging s
+WHERE r.municipality_code = s.municipality_code AND r.source_key = s.source_key;
+"""
+
+## 4. new restaurants -> restaurants + their first delta row
+insert_new_restaurants_from_staging = """
+WITH inserted AS (
+    INSERT INTO restaurants (
+        district_id,
+        municipality_code,
+        source_key,
+        snapshot_id,
+        last_snapshot_id,
+        name,
+        categories,
+        address,
+        price,
+        likes, 
+        photos,
+        tips,
+        rating,
+        rating_signals,
+        price_code,
+        post_code,
+        geom
+    )
+    SELECT 
+        s.district_id, s.municipality_code, s.source_key,
+        %(snapshot_id)s, %(snapshot_id)s,
+        s.name, s.categories, s.address, s.price,
+        s.likes, s.photos, s.tips, s.rating, s.rating_signals, s.price_code,
+        s.post_code, s.geom
+    FROM restaurants_staging s
+    WHERE NOT EXISTS (
+        SELECT 1 FROM restaurants r
+        WHERE r.municipality_code = s.municipality_code
+            AND r.source_key = s.source_key
+    )
+    RETURNING 
+        municipality_code, restaurant_id, snapshot_id,
+        likes, photos, tips, rating, rating_signals, price_code
+)
+INSERT INTO restaurant_metric_deltas (
+    municipality_code, restaurant_id, snapshot_id,
+    likes, photos, tips, rating, rating_signals, price_code
+)
+SELECT * FROM inserted;
+"""
+
+update_restaurant_snapshot_count = """
+UPDATE restaurant_snapshots
+SET restaurant_count = (SELECT COUNT(*) FROM restaurants_staging)
+WHERE snapshot_id = %(snapshot_id)s;
+"""
+
 create_ksu_gates_table = """
 CREATE TABLE IF NOT EXISTS ksu_gates (
     gate_id INT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
@@ -99,7 +315,9 @@ CREATE TABLE IF NOT EXISTS ksu_gates (
     access_notes TEXT,
     latitude DOUBLE PRECISION,
     longitude DOUBLE PRECISION,
-    geom geometry(Point, 32638)
+    geom geometry(Point, 32638),
+    geom_4326 geometry(Point, 4326)
+        GENERATED ALWAYS AS (ST_Transform(geom, 4326)) STORED
 );
 """
 
@@ -123,17 +341,60 @@ VALUES (
 );
 """
 
+## indexes: GiST for the spatial predicates (ST_Contains / ST_DWithin / <->)
+## and for WGS84 map-extent lookups on geom_4326,
+## btree for the sidebar filters (campus, gate_name_en).
+create_spatial_indexes = """
+CREATE INDEX IF NOT EXISTS districts_geom_idx ON districts USING GIST (geom);
+CREATE INDEX IF NOT EXISTS restaurants_geom_idx ON restaurants USING GIST (geom);
+CREATE INDEX IF NOT EXISTS ksu_gates_geom_idx ON ksu_gates USING GIST (geom);
+CREATE INDEX IF NOT EXISTS districts_geom_4326_idx ON districts USING GIST (geom_4326);
+CREATE INDEX IF NOT EXISTS restaurants_geom_4326_idx ON restaurants USING GIST (geom_4326);
+CREATE INDEX IF NOT EXISTS ksu_gates_geom_4326_idx ON ksu_gates USING GIST (geom_4326);
+"""
+
+## created on the partitioned parent, so every partition gets its own index
+create_restaurants_district_index = """
+CREATE INDEX IF NOT EXISTS restaurants_district_idx
+ON restaurants (municipality_code, district_id);
+"""
+
+create_ksu_gates_filter_index = """
+CREATE INDEX IF NOT EXISTS ksu_gates_campus_gate_name_idx
+ON ksu_gates (campus, gate_name_en);
+"""
+
 
 drop_table_queries = [
     drop_districts_table,
     drop_restaurants_table,
-    drop_ksu_gates_table
+    drop_ksu_gates_table,
+    drop_restaurant_snapshots_table,
+    drop_restaurant_metric_deltas_table
+]
+
+create_index_queries = [
+    create_spatial_indexes,
+    create_ksu_gates_filter_index,
+    create_restaurants_district_index
 ]
 
 create_table_queries = [
     create_postgis_extension,
     create_districts_table,
     create_restaurants_table,
-    create_ksu_gates_table
+    create_ksu_gates_table,
+    create_restaurant_snapshots_table,
+    create_restaurant_metric_deltas_table,
+    *create_index_queries
 ]
 
+# table name -> CREATE TABLE statement, used to restore snapshots (snapshot.py)
+create_table_statements = {
+    "districts": create_districts_table,
+    "restaurants": create_restaurants_table,
+    "ksu_gates": create_ksu_gates_table,
+    "restaurant_snapshots": create_restaurant_snapshots_table,
+    "restaurant_metric_deltas": create_restaurant_metric_deltas_table,
+}
+
@@ -0,0 +1,400 @@
+"""
+Prometheus-style metrics and lightweight tracing for the ETL, the analysis
+loaders and the app.
+
+Disabled by default: every metric call and span first checks one module flag
+and returns, so instrumented code pays a function call and nothing else.
+setup_from_env() turns it on:
+
+    GEO_METRICS=1              collect metrics / spans in this process
+    GEO_METRICS_PORT=9108      serve them on http://127.0.0.1:<port>/metrics
+                               (recent spans as JSON on /spans)
+    GEO_METRICS_FILE=path.prom write the metrics text to a file at exit
+                               (e.g. for node_exporter's textfile collector
+                               when etl.py runs from cron)
+
+Metrics (labels in brackets):
+
+    geo_etl_rows_loaded_total [table]       rows inserted per table
+    geo_etl_rows_rejected_total [table]     rows sent to quarantine
+    geo_etl_insert_seconds [table]          insert duration per load
+    geo_etl_insert_rows_per_second [table]  throughput of the last load
+    geo_query_seconds [query]               latency per named query
+    geo_query_errors_total [query]          loaders that returned None
+    geo_cache_requests_total [cache,result] cache lookups (hit / stale / miss)
+    geo_pool_wait_seconds                   wait for a pooled connection
+    geo_pool_connections_in_use             connections currently borrowed
+    geo_span_seconds [span]                 duration of every span
+
+Cache hit ratio, e.g. in PromQL:
+    sum by (cache) (rate(geo_cache_requests_total{result!="miss"}[5m]))
+      / sum by (cache) (rate(geo_cache_requests_total[5m]))
+"""
+
+import atexit
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+MAX_RECENT_SPANS = 512
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_enabled = False
+_setup_lock = threading.Lock()
+_server = None
+_file_registered = False
+
+
+def enabled():
+    return _enabled
+
+
+def enable(on=True):
+    global _enabled
+    _enabled = bool(on)
+
+
+# -------------------------------------------------------------------
+# Metric types
+# -------------------------------------------------------------------
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value):
+        return [f"{self.name}{_label_text(self.labels, key)} {value:g}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        if not _enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        if not _enabled:
+            return
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        if not _enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        if not _enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [per-bucket counts..., sum, count]
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def _render_value(self, key, state):
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets, state):
+            cumulative += count
+            le = _label_text(self.labels, key, [f'le="{bound:g}"'])
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        le = _label_text(self.labels, key, ['le="+Inf"'])
+        lines.append(f"{self.name}_bucket{le} {state[-1]}")
+        lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {state[-2]:g}")
+        lines.append(f"{self.name}_count{_label_text(self.labels, key)} {state[-1]}")
+        return lines
+
+
+_registry = []
+
+
+def _register(metric):
+    _registry.append(metric)
+    return metric
+
+
+ROWS_LOADED = _register(Counter(
+    "geo_etl_rows_loaded_total", "Rows inserted by the ETL per table.", ["table"]))
+ROWS_REJECTED = _register(Counter(
+    "geo_etl_rows_rejected_total", "Rows rejected by validation per table.", ["table"]))
+INSERT_SECONDS = _register(Histogram(
+    "geo_etl_insert_seconds", "Duration of one table load (insert + commit).", ["table"]))
+INSERT_THROUGHPUT = _register(Gauge(
+    "geo_etl_insert_rows_per_second", "Insert throughput of the last load.", ["table"]))
+QUERY_SECONDS = _register(Histogram(
+    "geo_query_seconds", "Latency of named analysis queries.", ["query"]))
+QUERY_ERRORS = _register(Counter(
+    "geo_query_errors_total", "Named queries whose loader failed.", ["query"]))
+CACHE_REQUESTS = _register(Counter(
+    "geo_cache_requests_total", "Cache lookups by cache and result.", ["cache", "result"]))
+POOL_WAIT_SECONDS = _register(Histogram(
+    "geo_pool_wait_seconds", "Time spent waiting for a pooled connection."))
+POOL_IN_USE = _register(Gauge(
+    "geo_pool_connections_in_use", "Pooled connections currently borrowed."))
+SPAN_SECONDS = _register(Histogram(
+    "geo_span_seconds", "Duration of traced spans.", ["span"]))
+
+
+def render():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    for metric in _registry:
+        metric.reset()
+    _recent_spans.clear()
+
+
+# -------------------------------------------------------------------
+# Spans
+# -------------------------------------------------------------------
+_current_span = contextvars.ContextVar("geo_current_span", default=None)
+_recent_spans = deque(maxlen=MAX_RECENT_SPANS)
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """
+    A timed unit of work. Nested spans share the trace_id of the outermost
+    one and point at their parent. Finished spans go to geo_span_seconds and
+    to the recent spans list (/spans).
+    """
+
+    def __init__(self, name, attributes=None):
+        self.name = name
+        self.attributes = attributes or {}
+        parent = _current_span.get()
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.span_id = uuid.uuid4().hex[:16]
+        self.error = None
+
+    def __enter__(self):
+        self._token = _current_span.set(self)
+        self._start_wall = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self._start
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        SPAN_SECONDS.observe(duration, span=self.name)
+        _recent_spans.append({
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self._start_wall,
+            "duration_s": duration,
+            "error": self.error,
+            "attributes": self.attributes,
+        })
+        return False
+
+
+def span(name, **attributes):
+    """Context manager timing a block (a shared no-op when disabled)."""
+    if not _enabled:
+        return _NULL_SPAN
+    return Span(name, attributes)
+
+
+def recent_spans():
+    return list(_recent_spans)
+
+
+def traced(name):
+    """Decorator: run the function inside span(name)."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with Span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def timed_query(name):
+    """
+    Decorator for analysis loaders: span + geo_query_seconds{query=name},
+    and geo_query_errors_total when the loader returns None (its error path).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            with Span(f"query.{name}"):
+                result = func(*args, **kwargs)
+            QUERY_SECONDS.observe(time.perf_counter() - start, query=name)
+            if result is None:
+                QUERY_ERRORS.inc(query=name)
+            return result
+        return wrapper
+    return decorator
+
+
+def record_load(table, rows, seconds, rejected=0):
+    """Rows / duration / throughput of one ETL table load."""
+    if not _enabled:
+        return
+    ROWS_LOADED.inc(rows, table=table)
+    ROWS_REJECTED.inc(rejected, table=table)
+    INSERT_SECONDS.observe(seconds, table=table)
+    if seconds > 0:
+        INSERT_THROUGHPUT.set(rows / seconds, table=table)
+
+
+# -------------------------------------------------------------------
+# Export
+# -------------------------------------------------------------------
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] == "/metrics":
+            body, content_type = render().encode("utf-8"), CONTENT_TYPE
+        elif self.path.split("?")[0] == "/spans":
+            body = json.dumps(recent_spans()).encode("utf-8")
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_http_server(port, host="127.0.0.1"):
+    """Serve /metrics and /spans from a daemon thread (once per process)."""
+    global _server
+    with _setup_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(
+                target=_server.serve_forever, name="metrics-http", daemon=True
+            ).start()
+            print(f"metrics served on http://{host}:{port}/metrics")
+        return _server
+
+
+def write_metrics_file(path):
+    """Write render() to `path` atomically (textfile collectors read it any time)."""
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    staging = f"{path}.tmp-{os.getpid()}"
+    with open(staging, "w", encoding="utf-8") as f:
+        f.write(render())
+    os.replace(staging, path)
+
+
+def setup_from_env():
+    """
+    Enable and export according to GEO_METRICS / GEO_METRICS_PORT /
+    GEO_METRICS_FILE (see the module docstring). Safe to call repeatedly.
+    """
+    global _file_registered
+    port = os.environ.get("GEO_METRICS_PORT")
+    path = os.environ.get("GEO_METRICS_FILE")
+    if os.environ.get("GEO_METRICS", "") in ("", "0") and not port and not path:
+        return False
+
+    enable()
+    if port:
+        try:
+            start_http_server(int(port))
+        except OSError as e:
+            print("Error while starting metrics server:", e)
+    with _setup_lock:
+        if path and not _file_registered:
+            atexit.register(write_metrics_file, path)
+            _file_registered = True
+    return True
@@ -0,0 +1,253 @@
+"""
+Bounding-box aware cache for "what is inside the current map view" queries.
+
+Viewports are snapped to a regular lon / lat tile grid. The base tile side is
+`tile_deg` degrees; a zoomed-out view uses a coarser level (side
+tile_deg * 2**level) so it never needs more than `max_tiles_per_view` tiles.
+Results are cached per tile key (level, tile_x, tile_y):
+
+- a new viewport is answered from the cached tiles it covers, and only the
+  missing tiles are fetched, all of them in one query;
+- the tiles are combined and clipped to the exact viewport;
+- entries are evicted least-recently-used first once their total size
+  (DataFrame.memory_usage(deep=True)) exceeds `memory_budget_bytes`;
+- entries older than `max_age_seconds` (the query service ttl by default)
+  count as missing and are fetched again, so a new ETL / snapshot load shows
+  up like in the other caches.
+
+stats() reports tile hits / misses, hit ratio, queries run, evictions,
+expired tiles and the memory in use. The cache is shared by all sessions (see
+get_restaurant_tile_cache) and cleared whenever the query service is
+invalidated; two sessions missing the same tile at the same moment may both
+fetch it.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from riyadh_ksu_geo.analysis import load_restaurants_in_tiles
+from riyadh_ksu_geo.query_service import DEFAULT_TTL_SECONDS, get_query_service
+from riyadh_ksu_geo.telemetry import CACHE_REQUESTS
+
+
+DEFAULT_TILE_DEG = 0.01          # ~1.1 km at Riyadh's latitude
+DEFAULT_MAX_TILES_PER_VIEW = 64
+DEFAULT_MEMORY_BUDGET_BYTES = 64 * 1024 * 1024
+MAX_LEVEL = 20
+
+# bookkeeping cost per entry on top of the frame itself
+_ENTRY_OVERHEAD_BYTES = 256
+
+
+class BBoxTileCache:
+    """
+    LRU cache of per-tile query results.
+
+    Parameters
+    ----------
+    fetch_tiles : callable
+        fetch_tiles(tile_deg, tile_xs, tile_ys) -> DataFrame with `tile_x`,
+        `tile_y`, `lat` and `lon` columns for all requested tiles (or None
+        on error), e.g. analysis.load_restaurants_in_tiles on a connection.
+    tile_deg : float
+        Side of the finest tiles, in degrees.
+    max_tiles_per_view : int
+        Coarser levels are used when a viewport would need more tiles.
+    memory_budget_bytes : int
+        Upper bound for the cached frames.
+    max_age_seconds : float or None
+        Tiles older than this are fetched again (None: never expire).
+    """
+
+    def __init__(
+        self,
+        fetch_tiles,
+        tile_deg=DEFAULT_TILE_DEG,
+        max_tiles_per_view=DEFAULT_MAX_TILES_PER_VIEW,
+        memory_budget_bytes=DEFAULT_MEMORY_BUDGET_BYTES,
+        max_age_seconds=DEFAULT_TTL_SECONDS,
+    ):
+        self.fetch_tiles = fetch_tiles
+        self.tile_deg = tile_deg
+        self.max_tiles_per_view = max_tiles_per_view
+        self.memory_budget_bytes = memory_budget_bytes
+        self.max_age_seconds = max_age_seconds
+
+        self._tiles = OrderedDict()     # key -> (frame, size in bytes, loaded_at)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "queries": 0, "evictions": 0, "expired": 0}
+        # bumped by clear(); results fetched before a clear are not stored
+        self._generation = 0
+
+    # ---------------------------------------------------------------
+    # Tile keys
+    # ---------------------------------------------------------------
+    def level_tile_deg(self, level):
+        return self.tile_deg * 2 ** level
+
+    def tiles_for_bbox(self, west, south, east, north):
+        """
+        Level and tile keys [(level, tile_x, tile_y), ...] covering the
+        viewport, at the finest level with at most max_tiles_per_view tiles.
+        """
+        for level in range(MAX_LEVEL + 1):
+            size = self.level_tile_deg(level)
+            x0, x1 = math.floor(west / size), math.floor(east / size)
+            y0, y1 = math.floor(south / size), math.floor(north / size)
+            if (x1 - x0 + 1) * (y1 - y0 + 1) <= self.max_tiles_per_view:
+                break
+        return level, [
+            (level, tile_x, tile_y)
+            for tile_x in range(x0, x1 + 1)
+            for tile_y in range(y0, y1 + 1)
+        ]
+
+    # ---------------------------------------------------------------
+    # LRU
+    # ---------------------------------------------------------------
+    def _lookup(self, keys):
+        """
+        Cached frames for `keys` (marked as recently used) and the missing
+        keys, expired tiles included.
+        """
+        found, missing = {}, []
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                entry = self._tiles.get(key)
+                if entry is not None and (
+                    self.max_age_seconds is not None
+                    and now - entry[2] >= self.max_age_seconds
+                ):
+                    del self._tiles[key]
+                    self._bytes -= entry[1]
+                    self._stats["expired"] += 1
+                    entry = None
+                if entry is None:
+                    missing.append(key)
+                else:
+                    self._tiles.move_to_end(key)
+                    found[key] = entry[0]
+            self._stats["hits"] += len(found)
+            self._stats["misses"] += len(missing)
+        CACHE_REQUESTS.inc(len(found), cache="tiles", result="hit")
+        CACHE_REQUESTS.inc(len(missing), cache="tiles", result="miss")
+        return found, missing
+
+    def _store(self, key, frame, generation):
+        size = int(frame.memory_usage(deep=True).sum()) + _ENTRY_OVERHEAD_BYTES
+        if size > self.memory_budget_bytes:
+            return
+        with self._lock:
+            if generation != self._generation:
+                return
+            previous = self._tiles.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._tiles[key] = (frame, size, time.monotonic())
+            self._bytes += size
+            while self._bytes > self.memory_budget_bytes:
+                _, (_, evicted_size, _) = self._tiles.popitem(last=False)
+                self._bytes -= evicted_size
+                self._stats["evictions"] += 1
+
+    # ---------------------------------------------------------------
+    # Queries
+    # ---------------------------------------------------------------
+    def _fetch(self, level, missing):
+        """Fetch every missing tile with one query and split the result per tile."""
+        with self._lock:
+            self._stats["queries"] += 1
+            generation = self._generation
+        result = self.fetch_tiles(
+            self.level_tile_deg(level),
+            [tile_x for _, tile_x, _ in missing],
+            [tile_y for _, _, tile_y in missing],
+        )
+        if result is None:
+            return None
+
+        per_tile = {
+            (level, int(tile_x), int(tile_y)): frame.drop(columns=["tile_x", "tile_y"])
+            for (tile_x, tile_y), frame in result.groupby(["tile_x", "tile_y"], sort=False)
+        }
+        empty = result.drop(columns=["tile_x", "tile_y"]).iloc[0:0]
+
+        fetched = {}
+        for key in missing:
+            # empty tiles are cached too, so panning over them is free
+            frame = per_tile.get(key, empty).reset_index(drop=True)
+            self._store(key, frame, generation)
+            fetched[key] = frame
+        return fetched
+
+    def query(self, west, south, east, north):
+        """
+        Rows inside the viewport (lon west..east, lat south..north), combined
+        from cached tiles plus one query for the missing ones.
+        Returns None when that query fails.
+        """
+        level, keys = self.tiles_for_bbox(west, south, east, north)
+        frames, missing = self._lookup(keys)
+
+        if missing:
+            fetched = self._fetch(level, missing)
+            if fetched is None:
+                return None
+            frames.update(fetched)
+
+        parts = [frames[key] for key in keys if len(frames[key])]
+        if not parts:
+            return next(iter(frames.values())).iloc[0:0] if frames else pd.DataFrame()
+
+        combined = pd.concat(parts, ignore_index=True)
+        inside = (
+            combined["lon"].between(west, east)
+            & combined["lat"].between(south, north)
+        )
+        return combined[inside].reset_index(drop=True)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._tiles)
+            stats["bytes"] = self._bytes
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def clear(self, name=None):
+        """Drop every cached tile (`name` lets it serve as an invalidate callback)."""
+        with self._lock:
+            self._tiles.clear()
+            self._generation += 1
+            self._bytes = 0
+
+
+_restaurant_tile_cache = None
+_restaurant_tile_cache_lock = threading.Lock()
+
+
+def get_restaurant_tile_cache():
+    """
+    Return the process-wide restaurants tile cache. Missing tiles are
+    loaded on the query service's connection pool; tiles expire with the
+    service's ttl and are dropped by QueryService.invalidate().
+    """
+    global _restaurant_tile_cache
+    with _restaurant_tile_cache_lock:
+        if _restaurant_tile_cache is None:
+            service = get_query_service()
+            _restaurant_tile_cache = BBoxTileCache(
+                lambda tile_deg, tile_xs, tile_ys: service.run_with_connection(
+                    load_restaurants_in_tiles, tile_deg, tile_xs, tile_ys
+                ),
+                max_age_seconds=service.ttl,
+            )
+            service.add_invalidate_callback(_restaurant_tile_cache.clear)
+        return _restaurant_tile_cache
@@ -0,0 +1,202 @@
+"""
+Vectorized validation / repair stage for the ETL loads.
+
+Each validate_* function takes the renamed GeoDataFrame that etl.py is about
+to insert and returns (clean_gdf, rejected_gdf):
+
+- geometries are checked with shapely.is_valid and repaired with make_valid,
+  single parts are promoted to the column's multi-part type
+  (Polygon -> MultiPolygon for districts), and anything that still does not
+  match the table's geometry type is rejected.
+- attribute columns are coerced to the table's column types; values that
+  cannot be coerced reject the row, NaN becomes None (SQL NULL).
+
+Rejected rows carry a `reject_reason` column and are written to
+quarantine/<table>_rejected.csv by write_quarantine, so a load never aborts
+half way because of one bad row.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+
+
+QUARANTINE_DIR = "quarantine"
+
+_POLYGONAL = [shapely.GeometryType.POLYGON, shapely.GeometryType.MULTIPOLYGON]
+_TYPE_NAMES = {
+    shapely.GeometryType.POINT: "Point",
+    shapely.GeometryType.MULTIPOLYGON: "MultiPolygon",
+}
+
+
+def _add_reason(reasons, mask, reason):
+    """Append `reason` to the rows selected by `mask` (vectorized)."""
+    mask = np.asarray(mask, dtype=bool) & (reasons == "")
+    reasons[mask] = reason
+
+
+def _polygonal_parts(geoms):
+    """Collapse make_valid output (e.g. GeometryCollection) to MultiPolygons."""
+    parts, index = shapely.get_parts(geoms, return_index=True)
+    # GeometryCollection parts can themselves be MultiPolygons
+    sub_parts, sub_index = shapely.get_parts(parts, return_index=True)
+    index = index[sub_index]
+    keep = shapely.get_type_id(sub_parts) == shapely.GeometryType.POLYGON
+
+    result = np.full(len(geoms), None, dtype=object)
+    if keep.any():
+        merged = shapely.multipolygons(sub_parts[keep], indices=index[keep])
+        result[np.unique(index[keep])] = merged
+    return result
+
+
+def repair_geometries(gdf, expected_type, reasons):
+    """
+
+    Validate / repair the active geometry column in place and mark rows
+    whose geometry is missing or cannot become `expected_type`.
+    """
+    geoms = gdf.geometry.values.to_numpy().copy()
+
+    missing = shapely.is_missing(geoms) | shapely.is_empty(geoms)
+    _add_reason(reasons, missing, "missing geometry")
+
+    invalid = ~missing & ~shapely.is_valid(geoms)
+    if invalid.any():
+        geoms[invalid] = shapely.make_valid(geoms[invalid])
+
+    type_ids = shapely.get_type_id(geoms)
+
+    if expected_type == shapely.GeometryType.MULTIPOLYGON:
+        # make_valid can return collections / lines mixed with the polygons
+        mixed = ~missing & ~np.isin(type_ids, _POLYGONAL)
+        if mixed.any():
+            geoms[mixed] = _polygonal_parts(geoms[mixed])
+
+        single = shapely.get_type_id(geoms) == shapely.GeometryType.POLYGON
+        if single.any():
+            geoms[single] = shapely.multipolygons(
+                geoms[single], indices=np.arange(single.sum())
+            )
+        type_ids = shapely.get_type_id(geoms)
+
+    wrong_type = ~missing & (type_ids != expected_type)
+    _add_reason(reasons, wrong_type,
+                f"geometry is not a valid {_TYPE_NAMES[expected_type]}")
+
+    if expected_type == shapely.GeometryType.POINT:
+        coords_ok = np.isfinite(shapely.get_x(geoms)) & np.isfinite(shapely.get_y(geoms))
+        _add_reason(reasons, ~missing & ~wrong_type & ~coords_ok, "non-finite coordinates")
+
+    gdf[gdf.geometry.name] = gpd.GeoSeries(geoms, index=gdf.index, crs=gdf.crs)
+    return gdf
+
+
+def coerce_numeric(gdf, columns, reasons, integer=False):
+    """
+
+    Coerce `columns` to numbers. Values present in the source that do not
+    parse (or are not whole numbers when `integer`) reject the row.
+    """
+    for column in columns:
+        raw = gdf[column]
+        values = pd.to_numeric(raw, errors="coerce")
+        _add_reason(reasons, raw.notna() & values.isna(), f"non-numeric {column}")
+
+        if integer:
+            fractional = values.notna() & (values % 1 != 0)
+            _add_reason(reasons, fractional, f"non-integer {column}")
+            values = values.where(~fractional).astype("Int64")
+
+        # unparsable values stay as-is so the quarantine file shows them
+        gdf[column] = values.astype(object).where(
+            values.notna(), raw.astype(object).where(raw.notna(), None)
+        )
+    return gdf
+
+
+def coerce_text(gdf, columns):
+    """Coerce `columns` to str, mapping NaN to None and 12345.0 to '12345'."""
+    for column in columns:
+        values = gdf[column]
+        as_number = pd.to_numeric(values, errors="coerce")
+        whole = as_number.notna() & (as_number % 1 == 0)
+        text = values.astype(object).where(~whole, as_number.astype("Int64").astype(str))
+        gdf[column] = text.where(values.notna(), None).map(
+            lambda v: v if v is None else str(v)
+        )
+    return gdf
+
+
+def _split(gdf, reasons):
+    rejected_mask = reasons != ""
+    rejected = gdf[rejected_mask].copy()
+    rejected["reject_reason"] = reasons[rejected_mask]
+    return gdf[~rejected_mask].copy(), rejected
+
+
+def validate_districts(gdf):
+    """Validate / repair districts for geometry(MultiPolygon, 32638)."""
+    reasons = np.full(len(gdf), "", dtype=object)
+    gdf = repair_geometries(gdf.copy(), shapely.GeometryType.MULTIPOLYGON, reasons)
+    gdf = coerce_numeric(
+        gdf,
+        ["district_code", "neighborh_code", "municipality_code",
+         "municipality_no", "source_objectid"],
+        reasons,
+        integer=True,
+    )
+    gdf = coerce_text(gdf, ["district_name_en", "district_name_ar"])
+    return _split(gdf, reasons)
+
+
+def validate_restaurants(gdf):
+    """Validate restaurants for geometry(Point, 32638) and NUMERIC metrics."""
+    reasons = np.full(len(gdf), "", dtype=object)
+    gdf = repair_geometries(gdf.copy(), shapely.GeometryType.POINT, reasons)
+    gdf = coerce_numeric(
+        gdf,
+        ["likes", "photos", "tips", "rating", "rating_signals", "price_code"],
+        reasons,
+    )
+    gdf = coerce_text(gdf, ["name", "categories", "address", "price", "post_code"])
+    return _split(gdf, reasons)
+
+
+def validate_ksu_gates(gdf):
+    """Validate KSU gates for geometry(Point, 32638)."""
+    reasons = np.full(len(gdf), "", dtype=object)
+    gdf = repair_geometries(gdf.copy(), shapely.GeometryType.POINT, reasons)
+    gdf = coerce_numeric(gdf, ["latitude", "longitude"], reasons)
+    gdf = coerce_text(
+        gdf,
+        ["gate_name_en", "gate_name_ar", "campus", "road_name_en",
+         "road_name_ar", "gate_type", "access_notes"],
+    )
+    return _split(gdf, reasons)
+
+
+def write_quarantine(rejected, table, quarantine_dir=QUARANTINE_DIR):
+    """
+
+    Write rejected rows (geometry as WKT) to <quarantine_dir>/<table>_rejected.csv.
+    Returns the file path, or None when nothing was rejected (a quarantine
+    file left by a previous run is removed).
+    """
+    path = os.path.join(quarantine_dir, f"{table}_rejected.csv")
+    if len(rejected) == 0:
+        if os.path.exists(path):
+            os.remove(path)
+        return None
+
+    os.makedirs(quarantine_dir, exist_ok=True)
+
+    df = pd.DataFrame(rejected.drop(columns=rejected.geometry.name))
+    df["geometry_wkt"] = rejected.geometry.to_wkt()
+    df.to_csv(path, index=False)
+    print(f"{len(rejected)} rows rejected from {table}, see {path}")
+    return path